@@ -1,8 +1,11 @@
 # flake8: noqa
 from __future__ import unicode_literals, absolute_import
 
-from commonmark.main import commonmark
+from commonmark.main import commonmark, render_many
 from commonmark.dump import dumpAST, dumpJSON
 from commonmark.blocks import Parser
+from commonmark.cache import BlockCache, RenderCache
+from commonmark.common import LimitExceeded
+from commonmark.profile import Profile
 from commonmark.render.html import HtmlRenderer
 from commonmark.render.rst import ReStructuredTextRenderer
@@ -0,0 +1,578 @@
+#!/usr/bin/env python
+"""Benchmarks for commonmark.py.
+
+Run the benchmark suite with::
+
+    python -m commonmark.bench
+
+It parses and renders a set of reproducible workloads (the spec examples,
+a generated corpus and the pathological inputs) and reports throughput,
+latency and peak memory per workload and output format.  ``--json FILE``
+also writes the results as JSON, to compare between releases; see
+``--help`` for the other options.  ``--micro`` runs the older
+benchmarks of single parser features instead.
+"""
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+import argparse
+import gc
+import io
+import json
+import multiprocessing
+import platform
+import re
+import sys
+import time
+import timeit
+from collections import OrderedDict
+
+from commonmark.blocks import Parser
+from commonmark.common import escape_xml, normalize_uri, unescape_string
+from commonmark.dump import dumpAST, dumpJSON
+from commonmark.inlines import InlineParser
+from commonmark.main import render_many
+from commonmark.node import Node
+from commonmark.render.html import HtmlRenderer
+from commonmark.render.rst import ReStructuredTextRenderer
+
+
+def read_spec(path='spec.txt'):
+    """Return the contents of the CommonMark spec, which is used as a
+    realistic mixed workload.  Run from the repository root."""
+    with io.open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def spec_examples(spec, section=None):
+    """Return the Markdown of the examples in a section of the spec, or
+    in the whole spec if section is None."""
+    if section is not None:
+        start = spec.index('\n## %s\n' % section)
+        spec = spec[start:spec.index('\n## ', start + 1)]
+    return [example.replace('\u2192', '\t') for example in re.findall(
+        r'^`{32} example\n([\s\S]*?)^\.\n', spec, re.M)]
+
+
+def long_paragraph(size):
+    """Return a single paragraph of roughly ``size`` characters that
+    exercises most inline parsers."""
+    chunk = ('Some `code`, a [link](/url "title"), an <http://auto.link>, '
+             '&amp; an <span>inline tag</span> and \\* escapes.\n')
+    return chunk * (size // len(chunk) + 1)
+
+
+def large_document(size):
+    """Return a document of roughly ``size`` characters made of
+    repeated sections mixing common block and inline constructs."""
+    section = (
+        '## Section heading\n\n'
+        'A paragraph with *emphasis*, **strong**, `code` and a '
+        '[link](http://example.com "title").\n'
+        'It continues on a second line & ends here.\n\n'
+        '- item one\n'
+        '- item two\n'
+        '  1. nested\n'
+        '  2. list\n\n'
+        '> a quoted paragraph\n\n'
+        '```python\n'
+        'def f(x):\n'
+        '    return x < 1\n'
+        '```\n\n')
+    return section * (size // len(section) + 1)
+
+
+def deep_lists(depth, size):
+    """Return roughly ``size`` characters of lists nested ``depth``
+    levels deep, alternating bullet and ordered lists."""
+    lines = []
+    for level in range(depth):
+        marker = '1. ' if level % 2 else '- '
+        lines.append('  ' * level * 2 + marker + 'item at level %d' % level)
+    chunk = '\n'.join(lines) + '\n\n'
+    return chunk * (size // len(chunk) + 1)
+
+
+def code_blocks(size, lines=500):
+    """Return roughly ``size`` characters of fenced and indented code
+    blocks of ``lines`` lines each."""
+    line = 'x = compute(x, "<value>") & mask  # comment *not* emphasis\n'
+    chunk = ('```python\n' + line * lines + '```\n\n' +
+             ''.join('    ' + line for _ in range(lines)) + '\n')
+    return chunk * (size // len(chunk) + 1)
+
+
+def links_and_references(size, refs=200):
+    """Return roughly ``size`` characters of paragraphs of inline,
+    reference and autolinks, with ``refs`` reference definitions."""
+    definitions = ''.join(
+        '[ref %d]: http://example.com/%d "Title %d"\n' % (n, n, n)
+        for n in range(refs))
+    paragraphs = []
+    n = 0
+    while sum(map(len, paragraphs)) < size:
+        paragraphs.append(
+            'See [ref %d], [the docs][ref %d], [inline](/url/%d "t"), '
+            '![image](/img/%d.png) and <http://example.com/%d>.\n\n' % (
+                n % refs, (n + 1) % refs, n, n, n))
+        n += 1
+    return ''.join(paragraphs) + definitions
+
+
+def api_index(links=20000, urls=300):
+    """Return a link-dense list, like an API index or a changelog, of
+    ``links`` items linking to ``urls`` distinct pages, some of them with
+    non-ASCII paths."""
+    return ''.join(
+        '- [`func_%d`](/api/module_%d.html#func-%d "Function %d") '
+        'see [caf\u00e9 %d](/docs/caf\u00e9/%d) and <https://example.com/%d>\n'
+        % (n, n % urls, n % urls, n, n, n % urls, n % urls)
+        for n in range(links))
+
+
+def emphasis_storm(size):
+    """Return roughly ``size`` characters of dense, partly unmatched
+    emphasis delimiters."""
+    chunk = ('*a **b _c __d__ e_ f** g* h_ **i *j* k ***l*** m __n_ o* '
+             '_p *q **r s** t* u_ v** w __x *y* z__\n')
+    return chunk * (size // len(chunk) + 1)
+
+
+def pathological_inputs():
+    """Return the inputs of the pathological tests, at their sizes."""
+    from commonmark.tests.pathological_tests import CASES
+    return [CASES[name][0](CASES[name][1]) for name in sorted(CASES)]
+
+
+def workloads(spec, scale=1):
+    """Return an ordered dict of workload names to functions returning
+    the list of documents of the workload.
+
+    Each generated document is about ``scale * 20000`` characters.
+    """
+    size = int(scale * 20000)
+    return OrderedDict([
+        ('spec examples', lambda: spec_examples(spec)),
+        ('spec', lambda: [spec]),
+        ('long paragraphs', lambda: [long_paragraph(size)] * 10),
+        ('deep lists', lambda: [deep_lists(30, size)] * 10),
+        ('code blocks', lambda: [code_blocks(size)] * 10),
+        ('links and references',
+         lambda: [links_and_references(size)] * 10),
+        ('api index', lambda: [api_index(size // 100)] * 10),
+        ('emphasis storms', lambda: [emphasis_storm(size)] * 10),
+        ('mixed', lambda: [large_document(size)] * 10),
+        ('pathological', pathological_inputs),
+    ])
+
+
+def dump_ast(ast):
+    """Return the output of dumpAST, which prints it, as a string."""
+    stdout = sys.stdout
+    sys.stdout = io.StringIO() if sys.version_info >= (3,) else \
+        io.BytesIO()
+    try:
+        dumpAST(ast)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+FORMATS = OrderedDict([
+    ('html', lambda ast: HtmlRenderer().render(ast)),
+    ('rst', lambda ast: ReStructuredTextRenderer().render(ast)),
+    ('json', dumpJSON),
+    ('ast', dump_ast),
+])
+
+
+def percentile(samples, p):
+    """Return the ``p``th percentile of ``samples``, by nearest rank."""
+    samples = sorted(samples)
+    return samples[max(0, int(len(samples) * p / 100.0 + 0.5) - 1)]
+
+
+def timing_stats(size, times):
+    """Summarize the per document ``times`` of a pass over ``size``
+    bytes of input, repeated ``len(times) / documents`` times."""
+    total = sum(times)
+    return OrderedDict([
+        ('seconds', total),
+        ('mb_per_s', size / (1024 * 1024) / total if total else None),
+        ('p50_ms', percentile(times, 50) * 1000),
+        ('p99_ms', percentile(times, 99) * 1000),
+    ])
+
+
+def peak_memory(documents, formats):
+    """Return a dict of the largest peak memory, in bytes, traced by
+    tracemalloc while parsing one of ``documents`` ('parse') and while
+    then rendering it in each of ``formats``, counting the AST.  The
+    values are None without tracemalloc (before Python 3.4)."""
+    peaks = dict((name, None) for name in ('parse',) + tuple(formats))
+    try:
+        import tracemalloc
+    except ImportError:
+        return peaks
+    # Without reset_peak (before Python 3.9), the document is parsed
+    # again for each format.
+    reparse = not hasattr(tracemalloc, 'reset_peak')
+    for text in documents:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            ast = Parser().parse(text)
+            phases = [('parse', None)] + [
+                (name, FORMATS[name]) for name in formats]
+            for name, render in phases:
+                if render is not None:
+                    if reparse:
+                        tracemalloc.stop()
+                        gc.collect()
+                        tracemalloc.start()
+                        ast = Parser().parse(text)
+                    else:
+                        tracemalloc.reset_peak()
+                    render(ast)
+                peaks[name] = max(peaks[name] or 0,
+                                  tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        ast = None
+    return peaks
+
+
+def bench_workload(documents, formats=tuple(FORMATS), repeat=3,
+                   memory=True):
+    """Time parsing each of ``documents`` and rendering it in each of
+    ``formats``, ``repeat`` times.
+
+    Returns a dict of the input size and, for parsing and each format,
+    of the total time, throughput and median and 99th percentile latency
+    per document, with the peak memory of parsing and rendering if
+    ``memory`` is true (tracing memory is slow).
+    """
+    size = sum(len(text.encode('utf-8')) for text in documents) * repeat
+    parse_times = []
+    render_times = dict((name, []) for name in formats)
+    timer = timeit.default_timer
+    for _ in range(repeat):
+        for text in documents:
+            start = timer()
+            ast = Parser().parse(text)
+            parse_times.append(timer() - start)
+            for name in formats:
+                start = timer()
+                FORMATS[name](ast)
+                render_times[name].append(timer() - start)
+
+    result = OrderedDict([
+        ('documents', len(documents)),
+        ('bytes', size // repeat),
+        ('parse', timing_stats(size, parse_times)),
+    ])
+    for name in formats:
+        result[name] = timing_stats(size, render_times[name])
+    if memory:
+        for name, peak in peak_memory(documents, formats).items():
+            result[name]['peak_memory'] = peak
+    return result
+
+
+def run_suite(spec, names=None, formats=tuple(FORMATS), repeat=3, scale=1,
+              memory=True, out=None):
+    """Run the benchmark suite over the workloads called ``names`` (all by
+    default), printing a table to ``out`` if given.  Returns the results
+    as a dict that can be dumped as JSON."""
+    results = OrderedDict([
+        ('version', 1),
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('python', platform.python_implementation() + ' ' +
+         platform.python_version()),
+        ('platform', platform.platform()),
+        ('repeat', repeat),
+        ('scale', scale),
+        ('workloads', OrderedDict()),
+    ])
+    if out is not None:
+        print('%-22s %-6s %10s %10s %10s %12s' % (
+            'workload', 'phase', 'MB/s', 'p50 ms', 'p99 ms', 'peak KB'),
+            file=out)
+    for name, documents in workloads(spec, scale).items():
+        if names and name not in names:
+            continue
+        result = bench_workload(documents(), formats, repeat, memory)
+        results['workloads'][name] = result
+        if out is None:
+            continue
+        for phase in ('parse',) + tuple(formats):
+            stats = result[phase]
+            print('%-22s %-6s %10.2f %10.3f %10.3f %12s' % (
+                name[:22], phase, stats['mb_per_s'] or 0, stats['p50_ms'],
+                stats['p99_ms'], '-' if stats.get('peak_memory') is None
+                else stats['peak_memory'] // 1024), file=out)
+    return results
+
+
+def best_time(func, repeat=3):
+    """Return the fastest of ``repeat`` single runs of ``func``."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def bench_inline_scaling(sizes=(25000, 50000, 100000, 200000), repeat=3):
+    """Time parsing a single paragraph of increasing length.
+
+    Returns a list of ``(size, seconds)`` tuples.  The time per
+    character should stay roughly constant as the paragraph grows.
+    """
+    results = []
+    for size in sizes:
+        text = long_paragraph(size)
+        results.append(
+            (size, best_time(lambda: Parser().parse(text), repeat)))
+    return results
+
+
+def bench_block_throughput(text, repeat=3):
+    """Measure the speed of the block phase of parsing ``text``, in
+    lines per second."""
+    lines = text.count('\n') + 1
+    return lines / best_time(lambda: Parser().parse_blocks(text), repeat)
+
+
+def bench_emphasis(spec, repeat=1000):
+    """Time inline parsing of the examples of the emphasis section of
+    the spec, each as a paragraph, repeated ``repeat`` times.  Returns
+    seconds."""
+    examples = spec_examples(spec, 'Emphasis and strong emphasis')
+
+    def parse():
+        parser = InlineParser()
+        for _ in range(repeat):
+            for example in examples:
+                block = Node('paragraph', None)
+                block.string_content = example
+                parser.parse(block)
+
+    return best_time(parse)
+
+
+def bench_escaping(spec, repeat=20):
+    """Time ``escape_xml`` over the literals of the nodes of the spec and
+    ``unescape_string`` over the lines of its examples, ``repeat``
+    times.  Returns a ``(escape, unescape)`` tuple of seconds."""
+    literals = [node.literal for node, entering in Parser().parse(spec).walk()
+                if node.literal]
+    lines = [line for example in spec_examples(spec)
+             for line in example.split('\n')]
+
+    def escape():
+        for _ in range(repeat):
+            for literal in literals:
+                escape_xml(literal)
+
+    def unescape():
+        for _ in range(repeat):
+            for line in lines:
+                unescape_string(line)
+
+    return best_time(escape), best_time(unescape)
+
+
+def bench_normalize_uri(repeat=3):
+    """Time ``normalize_uri`` over the link destinations of an API index
+    (the inline ones and autolinks), in seconds."""
+    destinations = re.findall(r'\]\(([^ )]+)|<([^>]+)>', api_index())
+    destinations = [inline or auto for inline, auto in destinations]
+
+    def normalize():
+        for destination in destinations:
+            normalize_uri(destination)
+
+    return best_time(normalize, repeat)
+
+
+def bench_node_memory(text):
+    """Measure the memory retained by the AST of ``text``.
+
+    Returns a ``(nodes, bytes)`` tuple.  The byte count includes the
+    strings held by the nodes.  Requires ``tracemalloc`` (Python 3.4+).
+    """
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        ast = Parser().parse(text)
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    nodes = sum(1 for _, entering in ast.walk() if entering)
+    return nodes, size
+
+
+def bench_walk(text, repeat=5):
+    """Measure walking the AST of ``text`` with ``Node.walk()`` and with
+    ``Node.walker()``, in events per second.  Returns a ``(walk,
+    walker)`` tuple."""
+    ast = Parser().parse(text)
+    events = sum(1 for _ in ast.walk())
+
+    def walk():
+        for _ in ast.walk():
+            pass
+
+    def walker():
+        for _ in ast.walker():
+            pass
+
+    return (events / best_time(walk, repeat),
+            events / best_time(walker, repeat))
+
+
+def bench_render(text, repeat=5):
+    """Time rendering the AST of ``text`` to HTML, in seconds."""
+    ast = Parser().parse(text)
+    return best_time(lambda: HtmlRenderer().render(ast), repeat)
+
+
+def bench_large_render(size=10 * 1024 * 1024):
+    """Time rendering a ``size`` character document to HTML, in
+    seconds."""
+    return bench_render(large_document(size), repeat=1)
+
+
+def bench_reparse(lines=5000, number=200):
+    """Time ``Parser.reparse`` for a single character edit in the middle
+    of a ``lines`` line document, in seconds per edit."""
+    text = large_document(lines * 40)
+    text = '\n'.join(text.split('\n')[:lines]) + '\n'
+    state = [Parser().parse(text), text]
+    pos = text.index('continues', len(text) // 2)
+
+    def edit():
+        doc, text = state
+        new_text = text[:pos] + 'x' + text[pos:]
+        doc = Parser().reparse(doc, text, pos, pos, 'x')
+        state[:] = [Parser().reparse(doc, new_text, pos, pos + 1, ''), text]
+
+    return timeit.timeit(edit, number=number) / number / 2
+
+
+def bench_render_many(documents=200, size=20000, workers=None):
+    """Time ``render_many`` over ``documents`` documents of ``size``
+    characters with 1 up to ``workers`` processes (the CPU count by
+    default), doubling each time.
+
+    Returns a list of ``(workers, seconds)`` tuples.
+    """
+    texts = [large_document(size)] * documents
+    max_workers = workers or multiprocessing.cpu_count()
+    results = []
+    workers = 1
+    while True:
+        results.append((workers, best_time(
+            lambda: list(render_many(texts, workers=workers, chunksize=4)),
+            repeat=1)))
+        if workers >= max_workers:
+            return results
+        workers = min(workers * 2, max_workers)
+
+
+def micro():
+    print('Inline parsing of a single paragraph:')
+    for size, seconds in bench_inline_scaling():
+        print('  %8d chars: %8.4fs  %6.3f us/char' % (
+            size, seconds, seconds * 1e6 / size))
+
+    spec = read_spec()
+    print('Block parsing of spec.txt: %10.0f lines/s' %
+          bench_block_throughput(spec))
+    print('Block parsing of a 5 MB document: %10.0f lines/s' %
+          bench_block_throughput(large_document(5 * 1024 * 1024), 1))
+
+    print('Emphasis section of spec.txt, 1,000 times: %8.4fs' %
+          bench_emphasis(spec))
+
+    print('Walking the AST of a 2 MB document: '
+          '%10.0f events/s with walk(), %10.0f with walker()' %
+          bench_walk(large_document(2 * 1024 * 1024), 3))
+
+    print('escape_xml over the spec literals and unescape_string over its '
+          'example lines, 20 times: %8.4fs, %8.4fs' % bench_escaping(spec))
+
+    print('normalize_uri over the 60,000 destinations of an API index: '
+          '%8.4fs' % bench_normalize_uri())
+
+    print('HTML rendering of spec.txt: %8.4fs' % bench_render(spec))
+
+    print('HTML rendering of a 10 MB document: %8.4fs' %
+          bench_large_render())
+
+    print('Reparse after a one character edit in 5,000 lines: %8.4fms' %
+          (bench_reparse() * 1000))
+
+    print('render_many over 200 documents of 20 KB:')
+    for workers, seconds in bench_render_many():
+        print('  %3d workers: %8.4fs' % (workers, seconds))
+
+    print('AST memory for spec.txt:')
+    nodes, size = bench_node_memory(spec)
+    print('  %8d nodes: %8d bytes  %6.1f bytes/node' % (
+        nodes, size, size / nodes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m commonmark.bench',
+        description='Benchmark parsing and rendering of CommonMark.')
+    parser.add_argument(
+        '-w', '--workload', action='append',
+        help='Workload to run, may be repeated; defaults to all of: %s' %
+        ', '.join(workloads(None)))
+    parser.add_argument(
+        '-f', '--format', action='append', choices=list(FORMATS),
+        help='Output format to render, may be repeated; defaults to all')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help='Number of passes over each workload, defaults to 3')
+    parser.add_argument(
+        '-s', '--scale', type=float, default=1,
+        help='Size factor of the generated documents, defaults to 1 '
+        '(about 20 KB each)')
+    parser.add_argument(
+        '--spec', default='spec.txt',
+        help='Path to the CommonMark spec, defaults to spec.txt')
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help="Write the results as JSON to FILE, or '-' for STDOUT")
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help='Skip measuring peak memory, which is slow')
+    parser.add_argument(
+        '--micro', action='store_true',
+        help='Run the benchmarks of single parser features instead')
+    args = parser.parse_args(argv)
+    if args.micro:
+        micro()
+        return
+    spec = read_spec(args.spec)
+    if args.workload:
+        unknown = set(args.workload) - set(workloads(None))
+        if unknown:
+            parser.error('unknown workload: %s' % ', '.join(sorted(unknown)))
+    results = run_suite(
+        spec, args.workload, tuple(args.format or FORMATS), args.repeat,
+        args.scale, args.memory,
+        out=None if args.json == '-' else sys.stdout)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with io.open(args.json, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
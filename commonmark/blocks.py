@@ -1,22 +1,31 @@
 from __future__ import absolute_import, unicode_literals
 
+import multiprocessing
 import re
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
 from commonmark import common
-from commonmark.common import unescape_string
+from commonmark import inlines
+from commonmark.common import Budget, LimitExceeded, unescape_string
 from commonmark.inlines import InlineParser
-from commonmark.node import Node
+from commonmark.node import (
+    NODE_TYPES, Node, SourceSpans, materialize, type_code)
 
 
 CODE_INDENT = 4
+# Paragraphs spanning fewer characters of the source are copied, with
+# the ``source_spans`` option.
+MIN_SPANNED = 256
 reHtmlBlockOpen = [
     re.compile(r'.'),  # dummy for 0
-    re.compile(r'^<(?:script|pre|style)(?:\s|>|$)', re.IGNORECASE),
-    re.compile(r'^<!--'),
-    re.compile(r'^<[?]'),
-    re.compile(r'^<![A-Z]'),
-    re.compile(r'^<!\[CDATA\['),
+    re.compile(r'<(?:script|pre|style)(?:\s|>|$)', re.IGNORECASE),
+    re.compile(r'<!--'),
+    re.compile(r'<[?]'),
+    re.compile(r'<![A-Z]'),
+    re.compile(r'<!\[CDATA\['),
     re.compile(
-        r'^<[/]?(?:address|article|aside|base|basefont|blockquote|body|'
+        r'<[/]?(?:address|article|aside|base|basefont|blockquote|body|'
         r'caption|center|col|colgroup|dd|details|dialog|dir|div|dl|dt|'
         r'fieldset|figcaption|figure|footer|form|frame|frameset|h1|head|'
         r'header|hr|html|iframe|legend|li|link|main|menu|menuitem|'
@@ -25,7 +34,7 @@ reHtmlBlockOpen = [
         r'(?:\s|[/]?[>]|$)',
         re.IGNORECASE),
     re.compile(
-        '^(?:' + common.OPENTAG + '|' + common.CLOSETAG + ')\\s*$',
+        '(?:' + common.OPENTAG + '|' + common.CLOSETAG + ')\\s*$',
         re.IGNORECASE),
 ]
 reHtmlBlockClose = [
@@ -37,15 +46,15 @@ reHtmlBlockClose = [
     re.compile(r'\]\]>'),
 ]
 reThematicBreak = re.compile(
-    r'^(?:(?:\*[ \t]*){3,}|(?:_[ \t]*){3,}|(?:-[ \t]*){3,})[ \t]*$')
-reMaybeSpecial = re.compile(r'^[#`~*+_=<>0-9-]')
+    r'(?:(?:\*[ \t]*){3,}|(?:_[ \t]*){3,}|(?:-[ \t]*){3,})[ \t]*$')
+reMaybeSpecial = re.compile(r'[#`~*+_=<>0-9-]')
 reNonSpace = re.compile(r'[^ \t\f\v\r\n]')
-reBulletListMarker = re.compile(r'^[*+-]')
-reOrderedListMarker = re.compile(r'^(\d{1,9})([.)])')
-reATXHeadingMarker = re.compile(r'^#{1,6}(?:[ \t]+|$)')
-reCodeFence = re.compile(r'^`{3,}(?!.*`)|^~{3,}')
-reClosingCodeFence = re.compile(r'^(?:`{3,}|~{3,})(?= *$)')
-reSetextHeadingLine = re.compile(r'^(?:=+|-+)[ \t]*$')
+reBulletListMarker = re.compile(r'[*+-]')
+reOrderedListMarker = re.compile(r'(\d{1,9})([.)])')
+reATXHeadingMarker = re.compile(r'#{1,6}(?:[ \t]+|$)')
+reCodeFence = re.compile(r'`{3,}(?!.*`)|~{3,}')
+reClosingCodeFence = re.compile(r'(?:`{3,}|~{3,})(?= *$)')
+reSetextHeadingLine = re.compile(r'(?:=+|-+)[ \t]*$')
 reLineEnding = re.compile(r'\r\n|\n|\r')
 
 
@@ -54,6 +63,13 @@ def is_blank(s):
     return re.search(reNonSpace, s) is None
 
 
+def replace_nul(s):
+    """Replace NUL characters, for security."""
+    if '\0' in s:
+        return s.replace('\0', '\uFFFD')
+    return s
+
+
 def is_space_or_tab(s):
     return s in (' ', '\t')
 
@@ -65,6 +81,28 @@ def peek(ln, pos):
         return None
 
 
+# Top-level blocks that may be continued by lines after a blank line, or
+# by any lines at all; blocks are never parsed again on their own
+# right after one of these.
+NO_REPARSE_AFTER = ('list', 'code_block', 'html_block')
+
+
+def shift_sourcepos(block, delta):
+    """Add ``delta`` to the line numbers in the sourcepos of a block and
+    its descendant blocks."""
+    stack = [block]
+    while stack:
+        node = stack.pop()
+        if node.sourcepos:
+            node.sourcepos[0][0] += delta
+            node.sourcepos[1][0] += delta
+        if node.t in ('block_quote', 'list', 'item'):
+            child = node.first_child
+            while child is not None:
+                stack.append(child)
+                child = child.nxt
+
+
 def ends_with_blank_line(block):
     """ Returns true if block ends with a blank line,
     descending if needed into lists and sublists."""
@@ -85,7 +123,7 @@ def ends_with_blank_line(block):
 def parse_list_marker(parser, container):
     """ Parse a list marker and return data on the marker (type,
     start, delimiter, bullet character, padding) or None."""
-    rest = parser.current_line[parser.next_nonspace:]
+    ln = parser.current_line
     data = {
         'type': None,
         'tight': True,  # lists are tight by default
@@ -97,8 +135,8 @@ def parse_list_marker(parser, container):
     }
     if parser.indent >= 4:
         return None
-    m = re.search(reBulletListMarker, rest)
-    m2 = re.search(reOrderedListMarker, rest)
+    m = reBulletListMarker.match(ln, parser.next_nonspace)
+    m2 = reOrderedListMarker.match(ln, parser.next_nonspace)
     if m:
         data['type'] = 'bullet'
         data['bullet_char'] = m.group()[0]
@@ -111,15 +149,13 @@ def parse_list_marker(parser, container):
         return None
 
     # make sure we have spaces after
-    nextc = peek(parser.current_line, parser.next_nonspace + len(m.group()))
+    nextc = peek(ln, parser.next_nonspace + len(m.group()))
     if not (nextc is None or nextc == '\t' or nextc == ' '):
         return None
 
     # if it interrupts paragraph, make sure first line isn't blank
     if container.t == 'paragraph' and \
-       not re.search(
-           reNonSpace,
-           parser.current_line[parser.next_nonspace + len(m.group()):]):
+       not reNonSpace.search(ln, parser.next_nonspace + len(m.group())):
         return None
 
     # we've got a match! advance offset and calculate padding
@@ -323,7 +359,7 @@ class CodeBlock(Block):
             match = indent <= 3 and \
                 len(ln) >= parser.next_nonspace + 1 and \
                 ln[parser.next_nonspace] == container.fence_char and \
-                re.search(reClosingCodeFence, ln[parser.next_nonspace:])
+                reClosingCodeFence.match(ln, parser.next_nonspace)
             if match and len(match.group()) >= container.fence_length:
                 # closing fence - we're at end of line, so we can return
                 parser.finalize(container, parser.line_number)
@@ -433,6 +469,24 @@ class BlockStarts(object):
         'indented_code_block',
     ]
 
+    # The starts in METHODS that can match a line that is not indented,
+    # by the first non-space character of the line.  Lines starting with
+    # any other character can only be paragraph text.  On an indented
+    # line, only an indented code block can start.
+    TRIGGERS = dict(
+        [('>', ['block_quote']),
+         ('#', ['atx_heading']),
+         ('`', ['fenced_code_block']),
+         ('~', ['fenced_code_block']),
+         ('<', ['html_block']),
+         ('=', ['setext_heading']),
+         ('-', ['setext_heading', 'thematic_break', 'list_item']),
+         ('*', ['thematic_break', 'list_item']),
+         ('_', ['thematic_break']),
+         ('+', ['list_item'])] +
+        [(digit, ['list_item']) for digit in '0123456789'])
+    INDENTED = ['indented_code_block']
+
     @staticmethod
     def block_quote(parser, container=None):
         if not parser.indented and \
@@ -451,8 +505,8 @@ class BlockStarts(object):
     @staticmethod
     def atx_heading(parser, container=None):
         if not parser.indented:
-            m = re.search(reATXHeadingMarker,
-                          parser.current_line[parser.next_nonspace:])
+            m = reATXHeadingMarker.match(parser.current_line,
+                                         parser.next_nonspace)
             if m:
                 parser.advance_next_nonspace()
                 parser.advance_offset(len(m.group()), False)
@@ -475,9 +529,7 @@ class BlockStarts(object):
     @staticmethod
     def fenced_code_block(parser, container=None):
         if not parser.indented:
-            m = re.search(
-                reCodeFence,
-                parser.current_line[parser.next_nonspace:])
+            m = reCodeFence.match(parser.current_line, parser.next_nonspace)
             if m:
                 fence_length = len(m.group())
                 parser.close_unmatched_blocks()
@@ -497,10 +549,11 @@ class BlockStarts(object):
     def html_block(parser, container=None):
         if not parser.indented and \
            peek(parser.current_line, parser.next_nonspace) == '<':
-            s = parser.current_line[parser.next_nonspace:]
+            ln = parser.current_line
+            pos = parser.next_nonspace
 
             for block_type in range(1, 8):
-                if re.search(reHtmlBlockOpen[block_type], s) and \
+                if reHtmlBlockOpen[block_type].match(ln, pos) and \
                    (block_type < 7 or container.t != 'paragraph'):
                     parser.close_unmatched_blocks()
                     # We don't adjust parser.offset;
@@ -513,11 +566,13 @@ class BlockStarts(object):
     @staticmethod
     def setext_heading(parser, container=None):
         if not parser.indented and container.t == 'paragraph':
-            m = re.search(
-                reSetextHeadingLine,
-                parser.current_line[parser.next_nonspace:])
+            m = reSetextHeadingLine.match(
+                parser.current_line, parser.next_nonspace)
             if m:
                 parser.close_unmatched_blocks()
+                content = container.string_content
+                container.string_content = content.text() \
+                    if isinstance(content, SourceSpans) else ''.join(content)
                 # resolve reference link definitiosn
                 while peek(container.string_content, 0) == '[':
                     pos = parser.inline_parser.parseReference(
@@ -536,14 +591,16 @@ class BlockStarts(object):
                         len(parser.current_line) - parser.offset, False)
                     return 2
                 else:
+                    # the paragraph stays open
+                    container.string_content = [container.string_content]
                     return 0
 
         return 0
 
     @staticmethod
     def thematic_break(parser, container=None):
-        if not parser.indented and re.search(
-                reThematicBreak, parser.current_line[parser.next_nonspace:]):
+        if not parser.indented and reThematicBreak.match(
+                parser.current_line, parser.next_nonspace):
             parser.close_unmatched_blocks()
             parser.add_child('thematic_break', parser.next_nonspace)
             parser.advance_offset(
@@ -588,7 +645,17 @@ class BlockStarts(object):
 class Parser(object):
     def __init__(self, options={}):
         self.doc = Node('document', [[1, 1], [0, 0]])
-        self.block_starts = BlockStarts()
+        self.block_starts = starts = BlockStarts()
+        self.start_triggers = dict(
+            (c, [getattr(starts, name) for name in names])
+            for c, names in starts.TRIGGERS.items())
+        self.indented_starts = [
+            getattr(starts, name) for name in starts.INDENTED]
+        # Starts tried once containers are nested max_block_nesting deep.
+        self.leaf_triggers = dict(
+            (c, [getattr(starts, name) for name in names
+                 if name not in ('block_quote', 'list_item')])
+            for c, names in starts.TRIGGERS.items())
         self.tip = self.doc
         self.oldtip = self.doc
         self.current_line = ''
@@ -607,28 +674,83 @@ class Parser(object):
         self.last_line_length = 0
         self.inline_parser = InlineParser(options)
         self.options = options
+        self.pending = None
+        self.held = []
+        self.source = None
+        self.line_start = 0
+        self.line_lf = False
+        workers = options.get('inline_workers')
+        if workers and workers > 1:
+            # Worker processes can't add to the profile or to the step
+            # count of the parse.
+            for name in ('profile', 'max_steps'):
+                if options.get(name) is not None:
+                    raise ValueError(
+                        "the %s option can't be used with inline_workers"
+                        % name)
+        self.max_input_size = options.get('max_input_size')
+        self.max_nesting = options.get('max_block_nesting')
+        self.input_size = 0
+        self.budget = None
+        self.update_block_types()
+        profile = options.get('profile')
+        if profile is not None:
+            profile.instrument_parser(self)
+
+    def update_block_types(self):
+        """Set block_types, the Block classes of self.blocks indexed by
+        node type code, registering the codes of new block types."""
+        for t in self.blocks:
+            type_code(t)
+        self.block_types = [self.blocks.get(t) for t in NODE_TYPES]
 
     def add_line(self):
         """ Add a line to the block at the tip.  We assume the tip
         can accept lines -- that check should be done before calling this."""
+        content = self.tip.string_content
         if self.partially_consumed_tab:
             # Skip over tab
             self.offset += 1
             # Add space characters
             chars_to_tab = 4 - (self.column % 4)
-            self.tip.string_content += (' ' * chars_to_tab)
-        self.tip.string_content += (self.current_line[self.offset:] + '\n')
+            content.append(' ' * chars_to_tab)
+        elif isinstance(content, SourceSpans):
+            start = self.line_start + self.offset
+            end = self.line_start + len(self.current_line)
+            if not content:
+                content.append((start, end + 1) if self.line_lf
+                               else (start, end))
+                if not self.line_lf:
+                    content.append('\n')
+                return
+            last = content[-1]
+            if self.line_lf and isinstance(last, tuple) and last[1] == start:
+                # contiguous with the previous line
+                content[-1] = (last[0], end + 1)
+                return
+        content.append(self.current_line[self.offset:] + '\n')
 
     def add_child(self, tag, offset):
         """ Add block of type tag as a child of the tip.  If the tip can't
         accept children, close and finalize it and try its parent,
         and so on til we find a block that can accept children."""
-        while not self.blocks[self.tip.t].can_contain(tag):
+        while not self.block_types[self.tip.type_code].can_contain(tag):
             self.finalize(self.tip, self.line_number - 1)
 
         column_number = offset + 1
         new_block = Node(tag, [[self.line_number, column_number], [0, 0]])
-        new_block.string_content = ''
+        code = new_block.type_code
+        if code >= len(self.block_types) or self.block_types[code] is None:
+            # blocks was changed after the table was built
+            self.update_block_types()
+        # Blocks accepting lines collect them in a list until they are
+        # finalized, to avoid copying the content for every line.
+        if not self.block_types[code].accepts_lines:
+            new_block.string_content = ''
+        elif self.source is not None:
+            new_block.string_content = SourceSpans(self.source)
+        else:
+            new_block.string_content = []
         self.tip.append_child(new_block)
         self.tip = new_block
         return new_block
@@ -644,31 +766,43 @@ class Parser(object):
 
     def find_next_nonspace(self):
         current_line = self.current_line
-        i = self.offset
-        cols = self.column
+        i = self.next_nonspace
 
-        try:
-            c = current_line[i]
-        except IndexError:
-            c = ''
-        while c != '':
-            if c == ' ':
-                i += 1
-                cols += 1
-            elif c == '\t':
-                i += 1
-                cols += (4 - (cols % 4))
-            else:
-                break
+        if i > self.offset:
+            # Still ahead of the offset, so only spaces and tabs lie in
+            # between; rescanning them for every container would make
+            # deep nesting quadratic in the length of the line.
+            try:
+                c = current_line[i]
+            except IndexError:
+                c = ''
+        else:
+            i = self.offset
+            cols = self.column
 
             try:
                 c = current_line[i]
             except IndexError:
                 c = ''
+            while c != '':
+                if c == ' ':
+                    i += 1
+                    cols += 1
+                elif c == '\t':
+                    i += 1
+                    cols += (4 - (cols % 4))
+                else:
+                    break
+
+                try:
+                    c = current_line[i]
+                except IndexError:
+                    c = ''
+
+            self.next_nonspace = i
+            self.next_nonspace_column = cols
 
         self.blank = (c == '\n' or c == '\r' or c == '')
-        self.next_nonspace = i
-        self.next_nonspace_column = cols
         self.indent = self.next_nonspace_column - self.column
         self.indented = self.indent >= CODE_INDENT
 
@@ -712,7 +846,8 @@ class Parser(object):
         """Analyze a line of text and update the document appropriately.
 
         We parse markdown text by calling this on each line of input,
-        then finalizing the document.
+        then finalizing the document.  NUL characters must already have
+        been replaced in the input.
         """
         all_matched = True
 
@@ -720,15 +855,13 @@ class Parser(object):
         self.oldtip = self.tip
         self.offset = 0
         self.column = 0
+        self.next_nonspace = 0
         self.blank = False
         self.partially_consumed_tab = False
         self.line_number += 1
-
-        # replace NUL characters for security
-        if re.search(r'\u0000', ln) is not None:
-            ln = re.sub(r'\0', '\uFFFD', ln)
-
         self.current_line = ln
+        if self.budget is not None:
+            self.budget.step()
 
         # For each containing block, try to parse the associated line start.
         # Bail out on failure: container will point to the last matching block.
@@ -741,7 +874,8 @@ class Parser(object):
 
             self.find_next_nonspace()
 
-            rv = self.blocks[container.t].continue_(self, container)
+            rv = self.block_types[container.type_code].continue_(
+                self, container)
             if rv == 0:
                 # we've matched, keep going
                 pass
@@ -765,23 +899,29 @@ class Parser(object):
         self.last_matched_container = container
 
         matched_leaf = container.t != 'paragraph' and \
-            self.blocks[container.t].accepts_lines
-        starts = self.block_starts
-        starts_len = len(starts.METHODS)
+            self.block_types[container.type_code].accepts_lines
+        triggers = self.start_triggers
         # Unless last matched container is a code block, try new container
         # starts, adding children to the last matched container:
         while not matched_leaf:
             self.find_next_nonspace()
 
-            # this is a little performance optimization:
-            if not self.indented and \
-               not re.search(reMaybeSpecial, ln[self.next_nonspace:]):
-                self.advance_next_nonspace()
-                break
+            if self.max_nesting is not None and \
+               self.nesting(container) >= self.max_nesting:
+                # too deep: block quote and list markers become text
+                triggers = self.leaf_triggers
 
-            i = 0
-            while i < starts_len:
-                res = getattr(starts, starts.METHODS[i])(self, container)
+            # only try the starts that can match the first character
+            if self.indented:
+                starts = self.indented_starts
+            else:
+                starts = triggers.get(peek(ln, self.next_nonspace))
+                if starts is None:
+                    self.advance_next_nonspace()
+                    break
+
+            for start in starts:
+                res = start(self, container)
                 if res == 1:
                     container = self.tip
                     break
@@ -789,10 +929,7 @@ class Parser(object):
                     container = self.tip
                     matched_leaf = True
                     break
-                else:
-                    i += 1
-
-            if i == starts_len:
+            else:
                 # nothing matched
                 self.advance_next_nonspace()
                 break
@@ -830,15 +967,14 @@ class Parser(object):
                 cont.last_line_blank = last_line_blank
                 cont = cont.parent
 
-            if self.blocks[t].accepts_lines:
+            if self.block_types[container.type_code].accepts_lines:
                 self.add_line()
                 # if HtmlBlock, check for end condition
                 if t == 'html_block' and \
                    container.html_block_type >= 1 and \
                    container.html_block_type <= 5 and \
-                   re.search(
-                       reHtmlBlockClose[container.html_block_type],
-                       self.current_line[self.offset:]):
+                   reHtmlBlockClose[container.html_block_type].search(
+                       self.current_line, self.offset):
                     self.finalize(container, self.line_number)
             elif self.offset < len(ln) and not self.blank:
                 # create a paragraph container for one line
@@ -857,8 +993,18 @@ class Parser(object):
         above = block.parent
         block.is_open = False
         block.sourcepos[1] = [line_number, self.last_line_length]
-
-        self.blocks[block.t].finalize(self, block)
+        content = block.string_content
+        if isinstance(content, SourceSpans):
+            # Paragraphs keep their spans until inlines are parsed, unless
+            # they may start with reference definitions or are so short
+            # that a copy takes less memory than the spans.
+            if block.t != 'paragraph' or content.first_char() == '[' or \
+               content.spanned() < MIN_SPANNED:
+                block.string_content = content.text()
+        elif isinstance(content, list):
+            block.string_content = ''.join(content)
+
+        self.block_types[block.type_code].finalize(self, block)
 
         self.tip = above
 
@@ -867,19 +1013,86 @@ class Parser(object):
         Walk through a block & children recursively, parsing string content
         into inline content where appropriate.
         """
-        walker = block.walker()
         self.inline_parser.refmap = self.refmap
         self.inline_parser.options = self.options
-        event = walker.nxt()
-        while event is not None:
-            node = event['node']
+        parse = self.inline_parser.parse
+        for node, entering in block.walk():
             t = node.t
-            if not event['entering'] and (t == 'paragraph' or t == 'heading'):
-                self.inline_parser.parse(node)
-            event = walker.nxt()
+            if not entering and (t == 'paragraph' or t == 'heading'):
+                parse(node)
 
-    def parse(self, my_input):
-        """ The main parsing function.  Returns a parsed document AST."""
+    def process_inlines_parallel(self, block, workers):
+        """
+        Like process_inlines, but parse the paragraphs and headings of
+        block with a pool of ``workers`` processes, or threads on a
+        Python without the GIL.  Processes send back the inline nodes
+        dumped into tuples, which are then turned into nodes again.
+        """
+        leaves = [node for node, entering in block.walk()
+                  if not entering and node.t in ('paragraph', 'heading')]
+        chunksize = len(leaves) // (workers * 4) + 1
+        if not getattr(sys, '_is_gil_enabled', lambda: True)():
+            local = threading.local()
+
+            def parse(node):
+                parser = getattr(local, 'parser', None)
+                if parser is None:
+                    parser = local.parser = InlineParser(self.options)
+                    parser.refmap = self.refmap
+                    parser.budget = self.budget
+                parser.parse(node)
+
+            pool = ThreadPool(workers)
+            try:
+                pool.map(parse, leaves, chunksize)
+            finally:
+                pool.terminate()
+            return
+
+        deadline = self.budget.deadline if self.budget else None
+        pool = multiprocessing.Pool(
+            workers, inlines.init_worker,
+            (self.options, self.refmap, deadline))
+        try:
+            contents = [materialize(node.string_content) for node in leaves]
+            for node, dumped in zip(leaves, pool.imap(
+                    inlines.parse_content, contents, chunksize)):
+                inlines.load_inlines(node, dumped)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def reparse_inlines(self, block):
+        """
+        Throw away the inline content of a block & children and parse it
+        again, e.g. after new reference definitions became known.
+        """
+        leaves = [node for node, entering in block.walk()
+                  if not entering and node.t in ('paragraph', 'heading')]
+        for node in leaves:
+            while node.first_child:
+                node.first_child.unlink()
+        self.process_inlines(block)
+
+    def nesting(self, container):
+        """Return the number of block quotes and list items containing
+        ``container``, including itself."""
+        depth = 0
+        while container is not None:
+            if container.t == 'block_quote' or container.t == 'item':
+                depth += 1
+            container = container.parent
+        return depth
+
+    def check_size(self, size):
+        """Raise LimitExceeded if an input of ``size`` characters is over
+        the ``max_input_size`` option."""
+        if self.max_input_size is not None and size > self.max_input_size:
+            raise LimitExceeded('max_input_size', self.max_input_size)
+
+    def reset(self):
+        """Start a new, empty document."""
         self.doc = Node('document', [[1, 1], [0, 0]])
         self.tip = self.doc
         self.refmap = {}
@@ -889,18 +1102,279 @@ class Parser(object):
         self.column = 0
         self.last_matched_container = self.doc
         self.current_line = ''
-        lines = re.split(reLineEnding, my_input)
-        length = len(lines)
-        if len(my_input) > 0 and my_input[-1] == '\n':
-            # ignore last blank line created by final newline
-            length -= 1
-        for i in range(length):
-            self.incorporate_line(lines[i])
+        self.pending = None
+        self.held = []
+        self.source = None
+        self.input_size = 0
+        self.budget = Budget.start(self.options)
+        self.inline_parser.budget = self.budget
+
+    def feed(self, text):
+        """
+        Push a chunk of input into the parser.  Complete lines are parsed
+        right away; a trailing partial line waits for the next chunk.
+
+        Returns the list of top-level blocks closed so far, in document
+        order, with their inlines already parsed.  The blocks are
+        detached from ``self.doc``, so the parser only holds on to the
+        blocks that are still open.
+
+        A reference definition is only known once the paragraph holding
+        it is closed.  By default a block is emitted with its links
+        resolved against the definitions seen so far, so a reference used
+        before it is defined stays literal text.  With the
+        ``defer_references`` option, a block using an undefined label is
+        held back, together with all blocks after it, until all its
+        labels are defined or ``close()`` is called, and its inlines are
+        then parsed again.  This can hold back the rest of the document
+        when brackets are used literally.
+        """
+        if self.pending is None:
+            self.reset()
+            self.pending = []
+        self.input_size += len(text)
+        self.check_size(self.input_size)
+        # The pieces of a partial line are kept in a list and joined once
+        # its line ending arrives, so only the new chunk is scanned and a
+        # long line fed in small chunks is not copied for every chunk.
+        pending = self.pending
+        text = replace_nul(text)
+        if pending and pending[-1] == '\r':
+            text = pending.pop() + text
+        # a trailing \r may be the first half of a \r\n line ending
+        end = len(text) - 1 if text.endswith('\r') else len(text)
+        lines = re.split(reLineEnding, text[:end])
+        last = lines.pop()
+        if lines:
+            pending.append(lines[0])
+            lines[0] = ''.join(pending)
+            del pending[:]
+        if last:
+            pending.append(last)
+        if end < len(text):
+            pending.append('\r')
+        for ln in lines:
+            self.incorporate_line(ln)
+        return self.finished_blocks()
+
+    def close(self):
+        """
+        Finish the input pushed with ``feed()``.  Returns the remaining
+        top-level blocks, like ``feed()``.
+        """
+        if self.pending is None:
+            self.reset()
+        elif self.pending:
+            for ln in re.split(reLineEnding, ''.join(self.pending)):
+                self.incorporate_line(ln)
+        self.pending = None
+        while self.tip:
+            self.finalize(self.tip, self.line_number)
+        return self.finished_blocks(final=True)
+
+    def finished_blocks(self, final=False):
+        """
+        Detach closed top-level blocks from the document, parse their
+        inlines and return those that are ready to be emitted.
+        """
+        defer = self.options.get('defer_references')
+        block = self.doc.first_child
+        while block is not None and not block.is_open:
+            nxt = block.nxt
+            block.unlink()
+            if defer:
+                self.inline_parser.unresolved_labels = set()
+            self.process_inlines(block)
+            self.held.append((block, self.inline_parser.unresolved_labels))
+            block = nxt
+        self.inline_parser.unresolved_labels = None
+
+        ready = 0
+        for block, labels in self.held:
+            if labels:
+                if final:
+                    if any(label in self.refmap for label in labels):
+                        self.reparse_inlines(block)
+                elif all(label in self.refmap for label in labels):
+                    self.reparse_inlines(block)
+                else:
+                    break
+            ready += 1
+        blocks = [block for block, _ in self.held[:ready]]
+        del self.held[:ready]
+        return blocks
+
+    def parse_blocks(self, my_input):
+        """ Run the block phase over a whole input and close all blocks."""
+        my_input = replace_nul(my_input)
+        if self.options.get('source_spans'):
+            self.source = my_input
+        length = 0
+        pos = 0
+        for m in reLineEnding.finditer(my_input):
+            self.line_start = pos
+            self.line_lf = m.group() == '\n'
+            self.incorporate_line(my_input[pos:m.start()])
+            length += 1
+            pos = m.end()
+        # ignore last blank line created by final newline
+        if not my_input.endswith('\n'):
+            self.line_start = pos
+            self.line_lf = False
+            self.incorporate_line(my_input[pos:])
+            length += 1
         while (self.tip):
             self.finalize(self.tip, length)
-        self.process_inlines(self.doc)
+        self.source = None
+
+    def parse(self, my_input):
+        """ The main parsing function.  Returns a parsed document AST.
+
+        The reference map is kept as ``refmap`` on the returned document,
+        for use by ``reparse()``.  With the ``inline_workers`` option set
+        to more than 1, inlines are parsed by that many worker processes
+        (or threads, on a Python without the GIL).  The workers keep to
+        the ``time_limit`` of the whole parse; the ``profile`` and
+        ``max_steps`` options can't be used with them.
+
+        Raises LimitExceeded if the input is over the ``max_input_size``
+        option, or parsing takes over ``max_steps`` or ``time_limit``."""
+        self.check_size(len(my_input))
+        self.reset()
+        self.parse_blocks(my_input)
+        workers = self.options.get('inline_workers')
+        if workers and workers > 1:
+            self.process_inlines_parallel(self.doc, workers)
+        else:
+            self.process_inlines(self.doc)
+        self.doc.refmap = self.refmap
         return self.doc
 
+    def reparse(self, doc, old_text, start, end, replacement):
+        """
+        Update a document returned by ``parse(old_text)`` after the text
+        between offsets ``start`` and ``end`` of ``old_text`` is replaced
+        by ``replacement``.  Returns the document for the new text.
+
+        Only the top-level blocks around the edit are parsed again and
+        spliced into ``doc``, which is modified in place; the sourcepos
+        of the blocks after them is shifted.  The whole text is parsed
+        again instead when the edit may add, change or remove a reference
+        definition, when the blocks around the edit could merge with
+        their neighbours (lists, code and HTML blocks), or when the text
+        uses ``\\r`` line endings.
+        """
+        new_text = old_text[:start] + replacement + old_text[end:]
+        self.check_size(len(new_text))
+        refmap = getattr(doc, 'refmap', None)
+        blocks = []
+        block = doc.first_child
+        while block is not None:
+            blocks.append(block)
+            block = block.nxt
+        if refmap is None or not blocks or \
+           '\r' in old_text or '\r' in replacement:
+            return self.parse(new_text)
+
+        # Lines touched by the edit, in old_text.
+        first_line = old_text.count('\n', 0, start) + 1
+        last_line = first_line + old_text.count('\n', start, end)
+        num_lines = doc.sourcepos[1][0]
+        delta = replacement.count('\n') - (last_line - first_line)
+        anchor = (first_line, old_text.rfind('\n', 0, start) + 1)
+
+        def line_offset(line):
+            # Offset of the start of a line in old_text, found by walking
+            # from the start of the first line touched by the edit.
+            n, offset = anchor
+            while n > line:
+                offset = old_text.rfind('\n', 0, offset - 1) + 1
+                n -= 1
+            while n < line:
+                offset = old_text.find('\n', offset)
+                if offset < 0:
+                    return len(old_text)
+                offset += 1
+                n += 1
+            return offset
+
+        def separated(before_line, after_line):
+            # True if only blank lines, at least one, lie between the
+            # lines ``before_line`` and ``after_line``.
+            return before_line + 1 < after_line and is_blank(
+                old_text[line_offset(before_line + 1):line_offset(after_line)])
+
+        # Find the top-level blocks to parse again: those touched by the
+        # edit, extended until they are separated from their untouched
+        # neighbours by blank lines.
+        k = 0
+        while k + 1 < len(blocks) and \
+                blocks[k + 1].sourcepos[0][0] <= first_line:
+            k += 1
+        j = k
+        while j + 1 < len(blocks) and \
+                blocks[j + 1].sourcepos[0][0] <= last_line:
+            j += 1
+        while True:
+            region_start = 1 if k == 0 else \
+                min(blocks[k].sourcepos[0][0], first_line)
+            if k == 0 or (
+                    blocks[k - 1].t not in NO_REPARSE_AFTER and
+                    separated(blocks[k - 1].sourcepos[1][0], region_start)):
+                break
+            k -= 1
+        while True:
+            if j == len(blocks) - 1:
+                region_end = max(num_lines, last_line)
+                break
+            region_end = max(blocks[j].sourcepos[1][0], last_line)
+            if separated(region_end, blocks[j + 1].sourcepos[0][0]):
+                break
+            j += 1
+
+        # The region in old_text and new_text.
+        region_offset = line_offset(region_start)
+        old_region_end = line_offset(region_end + 1)
+        old_region = old_text[region_offset:old_region_end]
+        new_region = new_text[
+            region_offset:old_region_end + len(new_text) - len(old_text)]
+        if ']:' in old_region or ']:' in new_region:
+            return self.parse(new_text)
+
+        sub = Parser(self.options)
+        sub.reset()
+        sub.parse_blocks(new_region)
+        new_blocks = []
+        block = sub.doc.first_child
+        while block is not None:
+            new_blocks.append(block)
+            block = block.nxt
+        if sub.refmap or (new_blocks and j < len(blocks) - 1 and
+                          new_blocks[-1].t in NO_REPARSE_AFTER):
+            return self.parse(new_text)
+        sub.refmap = refmap
+        sub.process_inlines(sub.doc)
+
+        # Splice the new blocks in place of the old ones.
+        after = blocks[j + 1] if j + 1 < len(blocks) else None
+        for block in blocks[k:j + 1]:
+            block.unlink()
+        for block in new_blocks:
+            shift_sourcepos(block, region_start - 1)
+            if after is None:
+                doc.append_child(block)
+            else:
+                after.insert_before(block)
+        if delta:
+            for block in blocks[j + 1:]:
+                shift_sourcepos(block, delta)
+
+        # Same as the document's sourcepos set by parse().
+        last = new_text[:-1] if new_text.endswith('\n') else new_text
+        doc.sourcepos[1] = [last.count('\n') + 1,
+                            len(last) - last.rfind('\n') - 1]
+        return doc
+
 
 CAMEL_RE = re.compile("(.)([A-Z](?:[a-z]+|(?<=[a-z0-9].)))")
 Parser.blocks = dict(
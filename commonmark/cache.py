@@ -0,0 +1,381 @@
+"""Content-addressed caches of rendered documents and blocks."""
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from commonmark.blocks import Parser, reLineEnding
+from commonmark.inlines import InlineParser
+from commonmark.main import converter
+from commonmark.node import Node, materialize
+from commonmark.render.html import HtmlRenderer
+
+
+class LRUCache(object):
+    """
+    Thread-safe store of rendered strings, evicting the least recently
+    used entries once there are more than max_entries of them, or once
+    they take more than max_bytes.
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the entry for key, counting a hit, or None."""
+        with self.lock:
+            result = self.entries.pop(key, None)
+            if result is not None:
+                self.entries[key] = result
+                self.hits += 1
+            return result
+
+    def add(self, key, result):
+        """Store a result in memory, evicting old entries if needed."""
+        size = sys.getsizeof(result)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= sys.getsizeof(old)
+            self.entries[key] = result
+            self.size += size
+            while self.entries and (len(self.entries) > self.max_entries or
+                                    self.size > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= sys.getsizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Empty the memory cache and reset the statistics."""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return a dict of cache statistics."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.size,
+            }
+
+
+class RenderCache(LRUCache):
+    """
+    Cache of rendered CommonMark, keyed by a hash of the input text, the
+    output format and the parser/renderer options.
+
+    Entries are kept in memory and evicted least recently used first
+    once there are more than max_entries of them, or once they take more
+    than max_bytes.  If path is given, rendered output is also stored
+    as files in that directory and looked up there on a memory miss.
+    Once the directory holds more than max_disk_entries files, or files
+    of more than max_disk_bytes bytes, the least recently used files
+    are removed.  The disk limits default to the memory limits.
+
+    A cache can be shared between threads.
+
+    Example:
+
+    .. code:: python
+
+        import commonmark
+
+        cache = commonmark.RenderCache(max_entries=1000)
+        html = cache.render('Hello *world*')
+        html = commonmark.commonmark('Hello *world*', cache=cache)
+        print(cache.stats())
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024,
+                 path=None, max_disk_entries=None, max_disk_bytes=None):
+        super(RenderCache, self).__init__(max_entries, max_bytes)
+        self.path = path
+        self.max_disk_entries = max_disk_entries or max_entries
+        self.max_disk_bytes = max_disk_bytes or max_bytes
+        # file count and size of the directory, found on the first save
+        self.disk_entries = None
+        self.disk_size = 0
+        self.disk_lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def key(text, format='html', options=None):
+        """Return the hex digest identifying a rendering of text."""
+        h = hashlib.sha256()
+        h.update(json.dumps([format, options or {}], sort_keys=True,
+                            default=repr).encode('utf-8'))
+        h.update(b'\0')
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def render(self, text, format='html', options=None):
+        """Render text like commonmark.commonmark(), using the cache.
+
+        format is 'html' (default), 'json' or 'rst'; options are passed
+        to the Parser and HtmlRenderer.
+        """
+        key = self.key(text, format, options)
+        result = self.get(key)
+        if result is not None:
+            return result
+
+        result = self.load(key)
+        if result is None:
+            result = converter(format, options)(text)
+            self.save(key, result)
+            with self.lock:
+                self.misses += 1
+        else:
+            with self.lock:
+                self.disk_hits += 1
+        self.add(key, result)
+        return result
+
+    def file_path(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def load(self, key):
+        """Return the result stored on disk for key, or None."""
+        if self.path is None:
+            return None
+        filename = self.file_path(key)
+        try:
+            with io.open(filename, encoding='utf-8', newline='') as f:
+                result = f.read()
+            # the modification time orders files for pruning
+            os.utime(filename, None)
+        except (IOError, OSError):
+            return None
+        return result
+
+    def save(self, key, result):
+        """Store a result on disk, if the cache has a path."""
+        if self.path is None:
+            return
+        filename = self.file_path(key)
+        directory = os.path.dirname(filename)
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+        # write to a temporary file first so readers never see a
+        # partially written entry
+        fd, tmp = tempfile.mkstemp(prefix='tmp', dir=directory)
+        with io.open(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(result)
+        if hasattr(os, 'replace'):
+            os.replace(tmp, filename)
+        else:
+            os.rename(tmp, filename)
+
+        with self.disk_lock:
+            if self.disk_entries is None:
+                self.disk_entries, self.disk_size = self.disk_usage()
+            else:
+                # A replaced file is counted twice, until the next prune
+                # counts the files again.
+                self.disk_entries += 1
+                self.disk_size += os.path.getsize(filename)
+            if self.disk_entries > self.max_disk_entries or \
+               self.disk_size > self.max_disk_bytes:
+                self.prune()
+
+    def disk_files(self):
+        """Return a list of (mtime, size, filename) of the files stored
+        on disk."""
+        files = []
+        for directory, _, names in os.walk(self.path):
+            for name in names:
+                if name.startswith('tmp'):
+                    # being written by save()
+                    continue
+                filename = os.path.join(directory, name)
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    # removed by another cache using the directory
+                    continue
+                files.append((st.st_mtime, st.st_size, filename))
+        return files
+
+    def disk_usage(self):
+        """Return the number and total size of the files stored on
+        disk."""
+        files = self.disk_files()
+        return len(files), sum(size for _, size, _ in files)
+
+    def prune(self):
+        """Remove the least recently used files stored on disk until
+        they are within nine tenths of the disk limits, so that the
+        directory is not listed again on every save."""
+        files = sorted(self.disk_files())
+        entries = len(files)
+        size = sum(file_size for _, file_size, _ in files)
+        max_entries = self.max_disk_entries * 9 // 10
+        max_bytes = self.max_disk_bytes * 9 // 10
+        for _, file_size, filename in files:
+            if entries <= max_entries and size <= max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            entries -= 1
+            size -= file_size
+            with self.lock:
+                self.disk_evictions += 1
+        self.disk_entries, self.disk_size = entries, size
+
+    def clear(self):
+        """Empty the memory cache and reset the statistics."""
+        super(RenderCache, self).clear()
+        with self.lock:
+            self.disk_hits = self.disk_evictions = 0
+
+    def stats(self):
+        """Return a dict of cache statistics."""
+        stats = super(RenderCache, self).stats()
+        with self.lock:
+            stats['disk_hits'] = self.disk_hits
+            stats['disk_evictions'] = self.disk_evictions
+        return stats
+
+
+class BlockCache(LRUCache):
+    """
+    Cache of the HTML of top-level blocks, so that rendering a large
+    document again after a small edit only renders the blocks that
+    changed.
+
+    Each top-level block is keyed by a hash of its source lines (found
+    from its sourcepos) and of the reference definitions of the labels
+    the inline parser looks up in it, so a block is rendered again when
+    a definition it uses is added, changed or removed.  With the
+    ``sourcepos`` option, the key also includes the block's first line
+    number, so a block is rendered again when lines are inserted or
+    removed above it.  options are passed to the Parser and HtmlRenderer
+    and are fixed for the cache.
+
+    A cache can be shared between threads.
+
+    Example:
+
+    .. code:: python
+
+        import commonmark
+
+        cache = commonmark.BlockCache()
+        html = cache.render(text)
+        # after an edit, only the changed blocks are rendered again
+        html = cache.render(edited_text)
+    """
+    def __init__(self, max_entries=4096, max_bytes=64 * 1024 * 1024,
+                 options=None):
+        super(BlockCache, self).__init__(max_entries, max_bytes)
+        self.options = options or {}
+        self.prefix = json.dumps(self.options, sort_keys=True,
+                                 default=repr).encode('utf-8') + b'\0'
+
+    def parse(self, text):
+        """Parse text, and return the document and a dict of the set of
+        labels looked up in each paragraph and heading."""
+        parser = Parser(options=self.options)
+        inline_parser = parser.inline_parser
+        parse = inline_parser.parse
+        leaf_labels = {}
+
+        def parse_leaf(block):
+            labels = inline_parser.looked_up_labels = set()
+            parse(block)
+            leaf_labels[block] = labels
+        inline_parser.parse = parse_leaf
+        return parser.parse(text), leaf_labels
+
+    def labels(self, block, refmap, leaf_labels={}):
+        """Return the set of normalized labels that are looked up in the
+        reference map when parsing the inlines of block.  Labels of the
+        paragraphs and headings not in leaf_labels are found by parsing
+        them again."""
+        labels = set()
+        parser = None
+        for node, entering in block.walk():
+            if entering or node.t not in ('paragraph', 'heading'):
+                continue
+            if node in leaf_labels:
+                labels.update(leaf_labels[node])
+                continue
+            content = materialize(node.string_content)
+            if '[' not in content:
+                continue
+            if parser is None:
+                parser = InlineParser(self.options)
+                parser.refmap = refmap
+                parser.looked_up_labels = labels
+            # parse a copy, leaving the block's inlines alone
+            leaf = Node(node.t, None)
+            leaf.string_content = content
+            parser.parse(leaf)
+        return labels
+
+    def key(self, source, refmap, labels=(), line=None):
+        """Return the hex digest identifying the rendering of a block with
+        the given source, given the document's reference map, the labels
+        looked up in it and, if the rendering depends on it, the block's
+        first line number."""
+        refs = dict((label, refmap.get(label)) for label in labels)
+        h = hashlib.sha256(self.prefix)
+        h.update(json.dumps(refs, sort_keys=True).encode('utf-8'))
+        h.update(b'\0')
+        if line is not None:
+            h.update(('%d\0' % line).encode('ascii'))
+        h.update(source.encode('utf-8'))
+        return h.hexdigest()
+
+    def render(self, text, doc=None):
+        """Render text to HTML, reusing the HTML of unchanged blocks.
+
+        doc may be the result of parsing text with a Parser using the
+        same options, for instance from Parser.reparse(); otherwise text
+        is parsed here.
+        """
+        leaf_labels = {}
+        if doc is None:
+            doc, leaf_labels = self.parse(text)
+        refmap = getattr(doc, 'refmap', None) or {}
+        lines = reLineEnding.split(text)
+        renderer = HtmlRenderer(options=dict(self.options))
+        sourcepos = self.options.get('sourcepos')
+        out = []
+        block = doc.first_child
+        while block is not None:
+            (start, _), (end, _) = block.sourcepos
+            key = self.key('\n'.join(lines[start - 1:end]), refmap,
+                           self.labels(block, refmap, leaf_labels),
+                           start if sourcepos else None)
+            result = self.get(key)
+            if result is None:
+                result = renderer.render(block)
+                with self.lock:
+                    self.misses += 1
+                self.add(key, result)
+            out.append(result)
+            block = block.nxt
+        return ''.join(out)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 from __future__ import unicode_literals
 import argparse
+import io
+import os
 import sys
 import commonmark
 
@@ -14,10 +16,8 @@ def main():
         sys.setdefaultencoding('utf-8')
     parser.add_argument(
         'infile',
-        nargs="?",
-        type=argparse.FileType('r'),
-        default=sys.stdin,
-        help="Input Markdown file to parse, defaults to STDIN")
+        nargs="*",
+        help="Input Markdown file(s) to parse, defaults to STDIN")
     parser.add_argument(
         '-o',
         nargs="?",
@@ -26,9 +26,48 @@ def main():
         help="Output HTML/JSON file, defaults to STDOUT")
     parser.add_argument('-a', action="store_true", help="Print formatted AST")
     parser.add_argument('-aj', action="store_true", help="Output JSON AST")
+    parser.add_argument(
+        '-j',
+        type=int,
+        help="Number of worker processes to parse the input files with, "
+        "defaults to the CPU count when parsing several files")
+    parser.add_argument(
+        '-d',
+        help="Directory to write one HTML/JSON file per input file to, "
+        "created if needed")
     args = parser.parse_args()
+    if len(args.infile) > 1 or args.d or args.j is not None:
+        if not args.infile:
+            parser.error("-d and -j can't be used with STDIN")
+        if args.a:
+            parser.error("-a can only be used with one input file, "
+                         "without -d or -j")
+        for path in args.infile:
+            if not os.path.isfile(path):
+                parser.error("argument infile: can't open '%s'" % path)
+        outs = None
+        if args.d:
+            try:
+                outs = output_paths(
+                    args.infile, args.d, 'json' if args.aj else 'html')
+            except ValueError as e:
+                parser.error(str(e))
+            try:
+                os.makedirs(args.d)
+            except OSError as e:
+                if not os.path.isdir(args.d):
+                    parser.error("can't create directory '%s': %s" % (
+                        args.d, e))
+        render_files(args, outs)
+        exit()
+    if args.infile:
+        try:
+            f = argparse.FileType('r')(args.infile[0])
+        except argparse.ArgumentTypeError as e:
+            parser.error('argument infile: %s' % e)
+    else:
+        f = sys.stdin
     parser = commonmark.Parser()
-    f = args.infile
     o = args.o
     lines = []
     for line in f:
@@ -37,7 +76,7 @@ def main():
     ast = parser.parse(data)
     if not args.a and not args.aj:
         renderer = commonmark.HtmlRenderer()
-        o.write(renderer.render(ast))
+        renderer.render_to(ast, o)
         exit()
     if args.a:
         # print ast
@@ -45,9 +84,41 @@ def main():
         exit()
 
     # o.write(ast.to_JSON())
-    o.write(commonmark.dumpJSON(ast))
+    commonmark.dumpJSON(ast, o)
     exit()
 
 
+def output_paths(infiles, directory, format):
+    """Return the path in directory to write the output of each input
+    file to, or raise ValueError if two input files have the same name
+    and so would be written to the same path."""
+    outs = []
+    seen = {}
+    for path in infiles:
+        name = os.path.splitext(os.path.basename(path))[0]
+        out = os.path.join(directory, name + '.' + format)
+        key = os.path.normcase(out)
+        if key in seen:
+            raise ValueError('%s and %s would both be written to %s' % (
+                seen[key], path, out))
+        seen[key] = path
+        outs.append(out)
+    return outs
+
+
+def render_files(args, outs=None):
+    """Render several input files in parallel, to the output file or, if
+    outs is given, to the output path of each input file."""
+    format = 'json' if args.aj else 'html'
+    results = commonmark.render_many(
+        args.infile, format=format, workers=args.j, paths=True)
+    for i, result in enumerate(results):
+        if outs:
+            with io.open(outs[i], 'w', encoding='utf-8') as o:
+                o.write(result)
+        else:
+            args.o.write(result)
+
+
 if __name__ == '__main__':
     main()
@@ -2,7 +2,7 @@ from __future__ import absolute_import, unicode_literals
 
 from builtins import str
 import json
-from commonmark.node import is_container
+from commonmark.node import is_container, materialize
 
 
 def prepare(obj, topnode=False):
@@ -12,7 +12,7 @@ def prepare(obj, topnode=False):
     JSON.
     """
     a = []
-    for subnode, entered in obj.walker():
+    for subnode, entered in obj.walk():
         rep = {
             'type': subnode.t,
         }
@@ -20,7 +20,7 @@ def prepare(obj, topnode=False):
             rep['literal'] = subnode.literal
 
         if subnode.string_content:
-            rep['string_content'] = subnode.string_content
+            rep['string_content'] = materialize(subnode.string_content)
 
         if subnode.title:
             rep['title'] = subnode.title
@@ -47,9 +47,16 @@ def prepare(obj, topnode=False):
     return a
 
 
-def dumpJSON(obj):
-    """Output AST in JSON form, this is destructive of block."""
+def dumpJSON(obj, fp=None):
+    """Output AST in JSON form, this is destructive of block.
+
+    If a text stream ``fp`` is given, the JSON is written to it in
+    chunks instead of being returned as one string.
+    """
     prepared = prepare(obj)
+    if fp is not None:
+        json.dump(prepared, fp, indent=4, sort_keys=True)
+        return
     return json.dumps(prepared, indent=4, sort_keys=True)
 
 
@@ -71,7 +78,8 @@ def dumpAST(obj, ind=0, topnode=False):
     if obj.sourcepos:
         print("\t" + indChar + "Sourcepos: " + str(obj.sourcepos))
     if not obj.string_content == "":
-        print("\t" + indChar + "String content: " + (obj.string_content or ''))
+        print("\t" + indChar + "String content: " +
+              (materialize(obj.string_content) or ''))
     if not obj.info == "":
         print("\t" + indChar + "Info: " + (obj.info or ''))
     if not obj.literal == "":
@@ -101,8 +109,6 @@ def dumpAST(obj, ind=0, topnode=False):
                 str(obj.list_data.get('marker_offset')))
     if obj.walker:
         print("\t" + indChar + "Children:")
-        walker = obj.walker()
-        nxt = walker.nxt()
-        while nxt is not None and topnode is False:
-            dumpAST(nxt['node'], ind + 2, topnode=True)
-            nxt = walker.nxt()
+        if topnode is False:
+            for node, _ in obj.walk():
+                dumpAST(node, ind + 2, topnode=True)
@@ -3,8 +3,8 @@ from __future__ import absolute_import, unicode_literals, division
 import re
 import sys
 from commonmark import common
-from commonmark.common import normalize_uri, unescape_string
-from commonmark.node import Node
+from commonmark.common import Budget, normalize_uri, unescape_string
+from commonmark.node import Node, materialize
 from commonmark.normalize_reference import normalize_reference
 
 if sys.version_info >= (3, 0):
@@ -18,7 +18,9 @@ else:
     from commonmark import entitytrans
     HTMLunescape = entitytrans._unescape
 
-# Some regexps used in inline parser:
+# Some regexps used in inline parser.  They are applied with
+# ``regex.match(subject, pos)`` at the current position in the subject,
+# so they must not be anchored with ``^``.
 
 ESCAPED_CHAR = '\\\\' + common.ESCAPABLE
 
@@ -51,36 +53,40 @@ rePunctuation = re.compile(
 )
 
 reLinkTitle = re.compile(
-    '^(?:"(' + ESCAPED_CHAR + '|[^"\\x00])*"' +
+    '(?:"(' + ESCAPED_CHAR + '|[^"\\x00])*"' +
     '|' +
     '\'(' + ESCAPED_CHAR + '|[^\'\\x00])*\'' +
     '|' +
     '\\((' + ESCAPED_CHAR + '|[^()\\x00])*\\))')
-reLinkDestinationBraces = re.compile(r'^(?:<(?:[^<>\n\\\x00]|\\.)*>)')
+reLinkDestinationBraces = re.compile(r'(?:<(?:[^<>\n\\\x00]|\\.)*>)')
 
-reEscapable = re.compile('^' + common.ESCAPABLE)
-reEntityHere = re.compile('^' + common.ENTITY, re.IGNORECASE)
+reEscapable = re.compile(common.ESCAPABLE)
+reEntityHere = re.compile(common.ENTITY, re.IGNORECASE)
 reTicks = re.compile(r'`+')
-reTicksHere = re.compile(r'^`+')
+reTicksHere = re.compile(r'`+')
 reEllipses = re.compile(r'\.\.\.')
 reDash = re.compile(r'--+')
 reEmailAutolink = re.compile(
-    r"^<([a-zA-Z0-9.!#$%&'*+\/=?^_`{|}~-]+@[a-zA-Z0-9]"
+    r"<([a-zA-Z0-9.!#$%&'*+\/=?^_`{|}~-]+@[a-zA-Z0-9]"
     r"(?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?"
     r"(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*)>")
 reAutolink = re.compile(
-    r'^<[A-Za-z][A-Za-z0-9.+-]{1,31}:[^<>\x00-\x20]*>',
+    r'<[A-Za-z][A-Za-z0-9.+-]{1,31}:[^<>\x00-\x20]*>',
     re.IGNORECASE)
-reSpnl = re.compile(r'^ *(?:\n *)?')
-reWhitespaceChar = re.compile(r'^^[ \t\n\x0b\x0c\x0d]')
+reSpnl = re.compile(r' *(?:\n *)?')
+reWhitespaceChar = re.compile(r'[ \t\n\x0b\x0c\x0d]')
 reWhitespace = re.compile(r'[ \t\n\x0b\x0c\x0d]+')
-reUnicodeWhitespaceChar = re.compile(r'^\s')
+reUnicodeWhitespaceChar = re.compile(r'\s')
 reFinalSpace = re.compile(r' *$')
-reInitialSpace = re.compile(r'^ *')
-reSpaceAtEndOfLine = re.compile(r'^ *(?:\n|$)')
-reLinkLabel = re.compile(r'^\[(?:[^\\\[\]]|\\.){0,1000}\]')
+reInitialSpace = re.compile(r' *')
+reSpaceAtEndOfLine = re.compile(r' *(?:\n|$)')
+# Deepest nesting of unescaped parentheses in a link destination.  The
+# spec allows a limit, which keeps unclosed destinations from being
+# scanned again for every link.
+MAX_LINK_PAREN_DEPTH = 32
+reLinkLabel = re.compile(r'\[(?:[^\\\[\]]|\\.){0,1000}\]')
 # Matches a string of non-special characters.
-reMain = re.compile(r'^[^\n`\[\]\\!<&*_\'"]+', re.MULTILINE)
+reMain = re.compile(r'[^\n`\[\]\\!<&*_\'"]+')
 
 
 def text(s):
@@ -110,6 +116,41 @@ def smart_dashes(chars):
     return ('\u2014' * em_count) + ('\u2013' * en_count)
 
 
+class Delimiter(object):
+    """An entry of the delimiter stack: a run of emphasis characters or
+    a quote."""
+    __slots__ = ('cc', 'numdelims', 'origdelims', 'node', 'previous',
+                 'next', 'can_open', 'can_close')
+
+    def __init__(self, cc, numdelims, node, previous, can_open, can_close):
+        self.cc = cc
+        self.numdelims = numdelims
+        self.origdelims = numdelims
+        self.node = node
+        self.previous = previous
+        self.next = None
+        self.can_open = can_open
+        self.can_close = can_close
+
+
+class Bracket(object):
+    """An entry of the bracket stack: a ``[`` or ``![`` that may open a
+    link or image."""
+    __slots__ = ('node', 'previous', 'previous_delimiter', 'index', 'image',
+                 'links', 'bracket_after')
+
+    def __init__(self, node, previous, previous_delimiter, index, image,
+                 links):
+        self.node = node
+        self.previous = previous
+        self.previous_delimiter = previous_delimiter
+        self.index = index
+        self.image = image
+        # number of links made in the subject when the bracket was added
+        self.links = links
+        self.bracket_after = False
+
+
 class InlineParser(object):
     """INLINE PARSER
 
@@ -121,20 +162,40 @@ class InlineParser(object):
     def __init__(self, options={}):
         self.subject = ''
         self.brackets = None
+        self.links = 0
+        self.tick_runs = None
+        self.tick_next = None
         self.pos = 0
         self.refmap = {}
         self.options = options
+        # Limits for untrusted input; delimiters, references and inlines
+        # over them are left as literal text.
+        self.max_delimiters = options.get('max_delimiters')
+        self.max_references = options.get('max_references')
+        self.max_nesting = options.get('max_inline_nesting')
+        self.num_delimiters = 0
+        # Nesting depth of the emphasis, links and images made in the
+        # subject, with the max_inline_nesting option.
+        self.depths = {}
+        # Step and time budget shared with the block Parser, if any.
+        self.budget = None
+        # If set to a set, normalized labels of references that could
+        # not be resolved are added to it.
+        self.unresolved_labels = None
+        # If set to a set, the normalized label of every reference looked
+        # up, resolved or not, is added to it.
+        self.looked_up_labels = None
 
     def match(self, regexString):
         """
         If regexString matches at current position in the subject, advance
         position in subject and return the match; otherwise return None.
         """
-        match = re.search(regexString, self.subject[self.pos:])
+        match = regexString.match(self.subject, self.pos)
         if match is None:
             return None
         else:
-            self.pos += match.end()
+            self.pos = match.end()
             return match.group()
 
     def peek(self):
@@ -162,24 +223,50 @@ class InlineParser(object):
         if ticks is None:
             return False
         after_open_ticks = self.pos
-        matched = self.match(reTicks)
-        while matched is not None:
-            if matched == ticks:
-                node = Node('code', None)
-                contents = self.subject[after_open_ticks:self.pos-len(ticks)] \
-                    .replace('\n', ' ')
-                if contents.lstrip(' ') and contents[0] == contents[-1] == ' ':
-                    node.literal = contents[1:-1]
-                else:
-                    node.literal = contents
-                block.append_child(node)
-                return True
-            matched = self.match(reTicks)
+        closer = self.findClosingTicks(len(ticks), after_open_ticks)
+        if closer is not None:
+            self.pos = closer + len(ticks)
+            node = Node('code', None)
+            contents = self.subject[after_open_ticks:closer] \
+                .replace('\n', ' ')
+            if contents.lstrip(' ') and contents[0] == contents[-1] == ' ':
+                node.literal = contents[1:-1]
+            else:
+                node.literal = contents
+            block.append_child(node)
+            return True
         # If we got here, we didn't match a closing backtick sequence.
-        self.pos = after_open_ticks
         block.append_child(text(ticks))
         return True
 
+    def findClosingTicks(self, length, pos):
+        """
+        Return the start of the first run of exactly ``length`` backticks
+        at or after ``pos``, or None.
+
+        The runs of the subject are indexed by length the first time this
+        is called, and for each length we remember how far we have
+        looked.  Code spans are parsed left to right, so each run is
+        passed over at most once and a paragraph full of unmatched
+        backticks takes linear time.
+        """
+        if self.tick_runs is None:
+            self.tick_runs = {}
+            for m in reTicks.finditer(self.subject):
+                self.tick_runs.setdefault(
+                    m.end() - m.start(), []).append(m.start())
+            self.tick_next = {}
+        starts = self.tick_runs.get(length)
+        if starts is None:
+            return None
+        i = self.tick_next.get(length, 0)
+        while i < len(starts) and starts[i] < pos:
+            i += 1
+        self.tick_next[length] = i + 1
+        if i < len(starts):
+            return starts[i]
+        return None
+
     def parseBackslash(self, block):
         """
         Parse a backslash-escaped special character, adding either the
@@ -199,7 +286,7 @@ class InlineParser(object):
             self.pos += 1
             node = Node('linebreak', None)
             block.append_child(node)
-        elif subjchar and re.search(reEscapable, subjchar):
+        elif subjchar and reEscapable.match(subjchar):
             block.append_child(text(subjchar))
             self.pos += 1
         else:
@@ -273,13 +360,12 @@ class InlineParser(object):
             c_after = '\n'
 
         # Python 2 doesn't recognize '\xa0' as whitespace
-        after_is_whitespace = re.search(reUnicodeWhitespaceChar, c_after) or \
+        after_is_whitespace = reUnicodeWhitespaceChar.match(c_after) or \
             c_after == '\xa0'
-        after_is_punctuation = re.search(rePunctuation, c_after)
-        before_is_whitespace = re.search(
-            reUnicodeWhitespaceChar, c_before) or \
+        after_is_punctuation = rePunctuation.match(c_after)
+        before_is_whitespace = reUnicodeWhitespaceChar.match(c_before) or \
             c_before == '\xa0'
-        before_is_punctuation = re.search(rePunctuation, c_before)
+        before_is_punctuation = rePunctuation.match(c_before)
 
         left_flanking = not after_is_whitespace and \
             (not after_is_punctuation or
@@ -313,8 +399,14 @@ class InlineParser(object):
         res = self.scanDelims(cc)
         if not res:
             return False
-        numdelims = res.get('numdelims')
+        numdelims = res['numdelims']
         startpos = self.pos
+        if self.max_delimiters is not None and \
+           self.num_delimiters >= self.max_delimiters:
+            # too many delimiters: leave this run as text
+            self.pos += numdelims
+            block.append_child(text(self.subject[startpos:self.pos]))
+            return True
 
         self.pos += numdelims
         if cc == "'":
@@ -327,95 +419,114 @@ class InlineParser(object):
         block.append_child(node)
 
         # Add entry to stack for this opener
-        self.delimiters = {
-            'cc': cc,
-            'numdelims': numdelims,
-            'origdelims': numdelims,
-            'node': node,
-            'previous': self.delimiters,
-            'next': None,
-            'can_open': res.get('can_open'),
-            'can_close': res.get('can_close'),
-        }
-        if self.delimiters['previous'] is not None:
-            self.delimiters['previous']['next'] = self.delimiters
+        previous = self.delimiters
+        self.delimiters = Delimiter(cc, numdelims, node, previous,
+                                    res['can_open'], res['can_close'])
+        if previous is not None:
+            previous.next = self.delimiters
+        self.num_delimiters += 1
         return True
 
     def removeDelimiter(self, delim):
-        if delim.get('previous') is not None:
-            delim['previous']['next'] = delim.get('next')
-        if delim.get('next') is None:
+        self.num_delimiters -= 1
+        if delim.previous is not None:
+            delim.previous.next = delim.next
+        if delim.next is None:
             # Top of stack
-            self.delimiters = delim.get('previous')
+            self.delimiters = delim.previous
         else:
-            delim['next']['previous'] = delim.get('previous')
-
-    @staticmethod
-    def removeDelimitersBetween(bottom, top):
-        if bottom.get('next') != top:
-            bottom['next'] = top
-            top['previous'] = bottom
+            delim.next.previous = delim.previous
+
+    def removeDelimitersBetween(self, bottom, top):
+        if bottom.next is not top:
+            delim = bottom.next
+            while delim is not top:
+                self.num_delimiters -= 1
+                delim = delim.next
+            bottom.next = top
+            top.previous = bottom
+
+    def nestingBetween(self, first, last):
+        """Return the deepest nesting of emphasis, links and images among
+        the siblings after ``first`` and before ``last``."""
+        depth = 0
+        node = first.nxt
+        while node is not None and node is not last:
+            depth = max(depth, self.depths.get(node, 0))
+            node = node.nxt
+        return depth
 
     def processEmphasis(self, stack_bottom):
-        openers_bottom = {
-            '_': stack_bottom,
-            '*': stack_bottom,
-            "'": stack_bottom,
-            '"': stack_bottom,
-        }
+        # Lower bounds for the search for an opener, by closer character
+        # and, for emphasis, by whether the closer can open and by its
+        # length modulo 3, since these decide which openers can match.
+        openers_bottom = {}
+        # Delimiters whose inline literal must be shortened to numdelims.
+        # This is done once at the end, not for every match, so long runs
+        # of * or _ are not copied over and over.
+        trimmed = []
         odd_match = False
         use_delims = 0
 
         # Find first closer above stack_bottom
         closer = self.delimiters
-        while closer is not None and closer.get('previous') != stack_bottom:
-            closer = closer.get('previous')
+        while closer is not None and closer.previous is not stack_bottom:
+            closer = closer.previous
 
         # Move forward, looking for closers, and handling each
         while closer is not None:
-            if not closer.get('can_close'):
-                closer = closer.get('next')
+            if not closer.can_close:
+                closer = closer.next
             else:
                 # found emphasis closer. now look back for first
                 # matching opener:
-                opener = closer.get('previous')
+                opener = closer.previous
                 opener_found = False
-                closercc = closer.get('cc')
-                while (opener is not None and opener != stack_bottom and
-                       opener != openers_bottom[closercc]):
-                    odd_match = (closer.get('can_open') or
-                                 opener.get('can_close')) and \
-                                 closer['origdelims'] % 3 != 0 and \
-                                 (opener['origdelims'] +
-                                  closer['origdelims']) % 3 == 0
-                    if opener.get('cc') == closercc and \
-                       opener.get('can_open') and \
+                closercc = closer.cc
+                if closercc == '*' or closercc == '_':
+                    bottom_key = (closercc, closer.can_open,
+                                  closer.origdelims % 3)
+                else:
+                    bottom_key = closercc
+                bottom = openers_bottom.get(bottom_key, stack_bottom)
+                while (opener is not None and opener is not stack_bottom and
+                       opener is not bottom):
+                    odd_match = (closer.can_open or opener.can_close) and \
+                        closer.origdelims % 3 != 0 and \
+                        (opener.origdelims + closer.origdelims) % 3 == 0
+                    if opener.cc == closercc and opener.can_open and \
                        not odd_match:
                         opener_found = True
                         break
-                    opener = opener.get('previous')
+                    opener = opener.previous
                 old_closer = closer
 
+                if opener_found and self.max_nesting is not None and \
+                   (closercc == '*' or closercc == '_'):
+                    depth = self.nestingBetween(
+                        opener.node, closer.node) + 1
+                    if depth > self.max_nesting:
+                        # too deep: leave the delimiters as text
+                        opener_found = False
+
                 if closercc == '*' or closercc == '_':
                     if not opener_found:
-                        closer = closer.get('next')
+                        closer = closer.next
                     else:
                         # Calculate actual number of delimiters used from
                         # closer
                         use_delims = 2 if (
-                            closer['numdelims'] >= 2 and
-                            opener['numdelims'] >= 2) else 1
+                            closer.numdelims >= 2 and
+                            opener.numdelims >= 2) else 1
 
-                        opener_inl = opener.get('node')
-                        closer_inl = closer.get('node')
+                        opener_inl = opener.node
+                        closer_inl = closer.node
 
                         # Remove used delimiters from stack elts and inlines
-                        opener['numdelims'] -= use_delims
-                        closer['numdelims'] -= use_delims
-                        opener_inl.literal = opener_inl.literal[
-                            :len(opener_inl.literal) - use_delims]
-                        closer_inl.literal = closer_inl.literal[
-                            :len(closer_inl.literal) - use_delims]
+                        opener.numdelims -= use_delims
+                        closer.numdelims -= use_delims
+                        trimmed.append(opener)
+                        trimmed.append(closer)
 
                         # Build contents for new Emph element
                         if use_delims == 1:
@@ -431,48 +542,50 @@ class InlineParser(object):
                             tmp = nxt
 
                         opener_inl.insert_after(emph)
+                        if self.max_nesting is not None:
+                            self.depths[emph] = depth
 
                         # Remove elts between opener and closer in delimiters
                         # stack
                         self.removeDelimitersBetween(opener, closer)
 
                         # If opener has 0 delims, remove it and the inline
-                        if opener['numdelims'] == 0:
+                        if opener.numdelims == 0:
                             opener_inl.unlink()
                             self.removeDelimiter(opener)
 
-                        if closer['numdelims'] == 0:
+                        if closer.numdelims == 0:
                             closer_inl.unlink()
-                            tempstack = closer['next']
+                            tempstack = closer.next
                             self.removeDelimiter(closer)
                             closer = tempstack
 
                 elif closercc == "'":
-                    closer['node'].literal = '\u2019'
+                    closer.node.literal = '\u2019'
                     if opener_found:
-                        opener['node'].literal = '\u2018'
-                    closer = closer['next']
+                        opener.node.literal = '\u2018'
+                    closer = closer.next
 
                 elif closercc == '"':
-                    closer['node'].literal = '\u201D'
+                    closer.node.literal = '\u201D'
                     if opener_found:
-                        opener['node'].literal = '\u201C'
-                    closer = closer['next']
+                        opener.node.literal = '\u201C'
+                    closer = closer.next
 
-                if not opener_found and not odd_match:
+                if not opener_found:
                     # Set lower bound for future searches for openers:
-                    # We don't do this with odd_match because a **
-                    # that doesn't match an earlier * might turn into
-                    # an opener, and the * might be matched by something
-                    # else.
-                    openers_bottom[closercc] = old_closer['previous']
-                    if not old_closer['can_open']:
+                    openers_bottom[bottom_key] = old_closer.previous
+                    if not old_closer.can_open:
                         # We can remove a closer that can't be an opener,
                         # once we've seen there's no matching opener:
                         self.removeDelimiter(old_closer)
 
+        for delim in trimmed:
+            delim.node.literal = delim.node.literal[:delim.numdelims]
+
         # Remove all delimiters
-        while self.delimiters is not None and self.delimiters != stack_bottom:
+        while self.delimiters is not None and \
+                self.delimiters is not stack_bottom:
             self.removeDelimiter(self.delimiters)
 
     def parseLinkTitle(self):
@@ -503,21 +616,24 @@ class InlineParser(object):
                 c = self.peek()
                 if c is None:
                     break
-                if c == '\\' and re.search(
-                        reEscapable, self.subject[self.pos+1:self.pos+2]):
+                if c == '\\' and reEscapable.match(
+                        self.subject, self.pos + 1):
                     self.pos += 1
                     if self.peek() is not None:
                         self.pos += 1
                 elif c == '(':
                     self.pos += 1
                     openparens += 1
+                    if openparens > MAX_LINK_PAREN_DEPTH:
+                        self.pos = savepos
+                        return None
                 elif c == ')':
                     if openparens < 1:
                         break
                     else:
                         self.pos += 1
                         openparens -= 1
-                elif re.search(reWhitespaceChar, c):
+                elif reWhitespaceChar.match(c):
                     break
                 else:
                     self.pos += 1
@@ -598,15 +714,16 @@ class InlineParser(object):
             block.append_child(text(']'))
             return True
 
-        if not opener.get('active'):
-            # no matched opener, just return a literal
+        if not opener.image and opener.links != self.links:
+            # a link was made after this opener, and there are no links
+            # in links, so just return a literal
             block.append_child(text(']'))
             # take opener off brackets stack
             self.removeBracket()
             return True
 
         # If we got here, opener is a potential opener
-        is_image = opener.get('image')
+        is_image = opener.image
 
         # Check to see if we have a link/image
 
@@ -619,7 +736,7 @@ class InlineParser(object):
             dest = self.parseLinkDestination()
             if dest is not None and self.spnl():
                 # make sure there's a space before the title
-                if re.search(reWhitespaceChar, self.subject[self.pos-1]):
+                if reWhitespaceChar.match(self.subject, self.pos - 1):
                     title = self.parseLinkTitle()
                 if self.spnl() and self.peek() == ')':
                     self.pos += 1
@@ -631,53 +748,62 @@ class InlineParser(object):
             # Next, see if there's a link label
             beforelabel = self.pos
             n = self.parseLinkLabel()
+            reflabel = None
             if n > 2:
                 reflabel = self.subject[beforelabel:beforelabel + n]
-            elif not opener.get('bracket_after'):
+            elif not opener.bracket_after:
                 # Empty or missing second label means to use the first
                 # label as the reference.  The reference must not
                 # contain a bracket. If we know there's a bracket, we
                 # don't even bother checking it.
-                reflabel = self.subject[opener.get('index'):startpos]
+                reflabel = self.subject[opener.index:startpos]
             if n == 0:
                 # If shortcut reference link, rewind before spaces we skipped.
                 self.pos = savepos
 
             if reflabel:
                 # lookup rawlabel in refmap
-                link = self.refmap.get(normalize_reference(reflabel))
+                label = normalize_reference(reflabel)
+                link = self.refmap.get(label)
+                if self.looked_up_labels is not None:
+                    self.looked_up_labels.add(label)
                 if link:
                     dest = link['destination']
                     title = link['title']
                     matched = True
+                elif label and self.unresolved_labels is not None:
+                    self.unresolved_labels.add(label)
+
+        if matched and self.max_nesting is not None:
+            depth = self.nestingBetween(opener.node, None) + 1
+            if depth > self.max_nesting:
+                # too deep: leave the brackets as text
+                matched = False
 
         if matched:
             node = Node('image' if is_image else 'link', None)
+            if self.max_nesting is not None:
+                self.depths[node] = depth
 
             node.destination = dest
             node.title = title or ''
-            tmp = opener.get('node').nxt
+            tmp = opener.node.nxt
             while tmp:
                 nxt = tmp.nxt
                 tmp.unlink()
                 node.append_child(tmp)
                 tmp = nxt
             block.append_child(node)
-            self.processEmphasis(opener.get('previousDelimiter'))
+            self.processEmphasis(opener.previous_delimiter)
             self.removeBracket()
-            opener.get('node').unlink()
+            opener.node.unlink()
 
             # We remove this bracket and processEmphasis will remove
             # later delimiters.
             # Now, for a link, we also deactivate earlier link openers.
             # (no links in links)
             if not is_image:
-                opener = self.brackets
-                while opener is not None:
-                    if not opener.get('image'):
-                        # deactivate this opener
-                        opener['active'] = False
-                    opener = opener.get('previous')
+                self.links += 1
 
             return True
         else:
@@ -690,19 +816,13 @@ class InlineParser(object):
 
     def addBracket(self, node, index, image):
         if self.brackets is not None:
-            self.brackets['bracketAfter'] = True
-
-        self.brackets = {
-            'node': node,
-            'previous': self.brackets,
-            'previousDelimiter': self.delimiters,
-            'index': index,
-            'image': image,
-            'active': True,
-        }
+            self.brackets.bracket_after = True
+
+        self.brackets = Bracket(node, self.brackets, self.delimiters, index,
+                                image, self.links)
 
     def removeBracket(self):
-        self.brackets = self.brackets.get('previous')
+        self.brackets = self.brackets.previous
 
     def parseEntity(self, block):
         """Attempt to parse an entity."""
@@ -755,6 +875,9 @@ class InlineParser(object):
 
     def parseReference(self, s, refmap):
         """Attempt to parse a link reference, modifying refmap."""
+        if self.max_references is not None and \
+           len(refmap) >= self.max_references:
+            return 0
         self.subject = s
         self.pos = 0
         startpos = self.pos
@@ -869,12 +992,73 @@ class InlineParser(object):
         Parse string content in block into inline children,
         using refmap to resolve references.
         """
-        self.subject = block.string_content.strip()
+        self.subject = materialize(block.string_content).strip()
         self.pos = 0
         self.delimiters = None
         self.brackets = None
+        self.links = 0
+        self.tick_runs = None
+        self.num_delimiters = 0
+        self.depths = {}
+        budget = self.budget or Budget.start(self.options)
         while (self.parseInline(block)):
-            pass
+            if budget is not None:
+                budget.step()
         self.processEmphasis(None)
+        self.depths = {}
 
     parse = parseInlines
+
+
+# Inline parsing in worker processes, see Parser.process_inlines_parallel
+
+def dump_inlines(block):
+    """
+    Return the inline children of block as nested tuples of
+    (t, literal, destination, title, children), which pickle much more
+    compactly than Node objects.
+    """
+    dumped = []
+    node = block.first_child
+    while node is not None:
+        dumped.append((node.t, node.literal, node.destination, node.title,
+                       dump_inlines(node) if node.first_child else None))
+        node = node.nxt
+    return dumped
+
+
+def load_inlines(block, dumped):
+    """Append inline nodes dumped by dump_inlines to block."""
+    for t, literal, destination, title, children in dumped:
+        node = Node(t, None)
+        node.literal = literal
+        if destination is not None:
+            node.destination = destination
+        if title is not None:
+            node.title = title
+        if children:
+            load_inlines(node, children)
+        block.append_child(node)
+
+
+# Inline parser of the current worker process, set up by init_worker
+_inline_parser = None
+
+
+def init_worker(options, refmap, deadline=None):
+    global _inline_parser
+    _inline_parser = InlineParser(options)
+    _inline_parser.refmap = refmap
+    if deadline is not None:
+        # the time_limit of the whole parse
+        budget = _inline_parser.budget = Budget(
+            time_limit=options.get('time_limit'))
+        budget.deadline = deadline
+
+
+def parse_content(content):
+    """Parse string content into inlines and return them dumped."""
+    block = Node('paragraph', None)
+    block.string_content = content
+    _inline_parser.parse(block)
+    return dump_inlines(block)
@@ -11,20 +11,26 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import io
+import multiprocessing
+
 from commonmark.blocks import Parser
 from commonmark.dump import dumpAST, dumpJSON
 from commonmark.render.html import HtmlRenderer
 from commonmark.render.rst import ReStructuredTextRenderer
 
 
-def commonmark(text, format="html"):
+def commonmark(text, format="html", cache=None):
     """Render CommonMark into HTML, JSON or AST
     Optional keyword arguments:
     format:     'html' (default), 'json' or 'ast'
+    cache:      a RenderCache to look the result up in and store it in
 
     >>> commonmark("*hello!*")
     '<p><em>hello</em></p>\\n'
     """
+    if cache is not None and format in ["html", "json", "rst"]:
+        return cache.render(text, format)
     parser = Parser()
     ast = parser.parse(text)
     if format not in ["html", "json", "ast", "rst"]:
@@ -39,3 +45,84 @@ def commonmark(text, format="html"):
     if format == "rst":
         renderer = ReStructuredTextRenderer()
         return renderer.render(ast)
+
+
+def converter(format="html", options=None):
+    """Return a function rendering CommonMark text into HTML, JSON or
+    reStructuredText, reusing one parser and renderer for every call.
+
+    options are passed to the Parser and, for HTML, to the HtmlRenderer.
+    """
+    options = dict(options or {})
+    parser = Parser(options)
+    if format == "html":
+        output = HtmlRenderer(options).render
+    elif format == "rst":
+        output = ReStructuredTextRenderer().render
+    elif format == "json":
+        output = dumpJSON
+    else:
+        raise ValueError("format must be 'html', 'json' or 'rst'")
+
+    def convert(text):
+        return output(parser.parse(text))
+    return convert
+
+
+def read_text(path):
+    with io.open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+# Converter of the current worker process, set up by init_worker
+_convert = None
+
+
+def init_worker(format, options):
+    global _convert
+    _convert = converter(format, options)
+
+
+def convert_text(text):
+    return _convert(text)
+
+
+def convert_path(path):
+    return _convert(read_text(path))
+
+
+def render_many(texts, format="html", workers=None, chunksize=1,
+                options=None, paths=False):
+    """Render many CommonMark documents, spread over a process pool.
+
+    Yields the results in the order of texts, as they become available.
+    Each worker process reuses one parser and renderer.
+
+    Optional keyword arguments:
+    format:     'html' (default), 'json' or 'rst'
+    workers:    number of worker processes, defaults to the CPU count;
+                1 renders in the current process
+    chunksize:  number of documents sent to a worker at a time
+    options:    options for the Parser and HtmlRenderer
+    paths:      if True, texts are paths of UTF-8 files to read
+
+    >>> list(render_many(["*a*", "b"], workers=2))
+    ['<p><em>a</em></p>\\n', '<p>b</p>\\n']
+    """
+    if workers == 1:
+        convert = converter(format, options)
+        for text in texts:
+            yield convert(read_text(text) if paths else text)
+        return
+
+    # fail early, in this process, on a bad format
+    converter(format, options)
+    pool = multiprocessing.Pool(workers, init_worker, (format, options))
+    try:
+        for result in pool.imap(convert_path if paths else convert_text,
+                                texts, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -1,6 +1,8 @@
 from __future__ import unicode_literals
 
+import operator
 import re
+import threading
 
 
 reContainer = re.compile(
@@ -9,8 +11,130 @@ reContainer = re.compile(
     r'custom_inline|custom_block)')
 
 
+try:
+    from types import MappingProxyType
+    # Shared, read-only list_data for nodes that are not lists or items
+    EMPTY_LIST_DATA = MappingProxyType({})
+except ImportError:
+    EMPTY_LIST_DATA = {}
+
+
+class SourceSpans(list):
+    """
+    Content of a leaf block, built by the Parser with the
+    ``source_spans`` option.  Each item is either a ``(start, end)``
+    range of offsets into ``source``, or a string for text that is not
+    a contiguous part of the source (lines after a container prefix or
+    a partially consumed tab, or with a line ending other than ``\\n``).
+    The text itself is only copied out of the source by ``text()``.
+    """
+    __slots__ = ('source',)
+
+    def __init__(self, source):
+        super(SourceSpans, self).__init__()
+        self.source = source
+
+    def text(self):
+        source = self.source
+        return ''.join(
+            source[piece[0]:piece[1]] if isinstance(piece, tuple) else piece
+            for piece in self)
+
+    def spanned(self):
+        """Return the number of characters held as ranges."""
+        return sum(piece[1] - piece[0] for piece in self
+                   if isinstance(piece, tuple))
+
+    def first_char(self):
+        for piece in self:
+            if isinstance(piece, tuple):
+                if piece[1] > piece[0]:
+                    return self.source[piece[0]]
+            elif piece:
+                return piece[0]
+        return None
+
+    def __reduce__(self):
+        # pickle as the text, not the whole source
+        return (type(''), (self.text(),))
+
+
+def materialize(content):
+    """Return string_content as a string."""
+    if isinstance(content, SourceSpans):
+        return content.text()
+    return content
+
+
+# Node types, in the order of their integer codes, which index the
+# dispatch tables of the walker, Parser and renderers.  Custom node
+# types get the next free code the first time a node of that type is
+# created.
+NODE_TYPES = [
+    'document', 'block_quote', 'list', 'item', 'paragraph', 'heading',
+    'thematic_break', 'code_block', 'html_block', 'custom_block',
+    'text', 'softbreak', 'linebreak', 'code', 'html_inline', 'emph',
+    'strong', 'link', 'image', 'custom_inline']
+TYPE_CODES = dict((t, code) for code, t in enumerate(NODE_TYPES))
+# Whether the node type of each code is a container.
+CONTAINERS = [re.search(reContainer, t) is not None for t in NODE_TYPES]
+_register_lock = threading.Lock()
+
+
+def type_code(t):
+    """Return the integer code of node type t, registering it if it is
+    a new custom type."""
+    try:
+        return TYPE_CODES[t]
+    except KeyError:
+        pass
+    with _register_lock:
+        if t not in TYPE_CODES:
+            CONTAINERS.append(re.search(reContainer, t) is not None)
+            NODE_TYPES.append(t)
+            TYPE_CODES[t] = len(NODE_TYPES) - 1
+        return TYPE_CODES[t]
+
+
+def is_container_type(t):
+    return CONTAINERS[type_code(t)]
+
+
 def is_container(node):
-    return (re.search(reContainer, node.t) is not None)
+    return is_container_type(node.t)
+
+
+def walk(root):
+    """
+    Generator of ``(node, entering)`` tuples over the tree under root,
+    in the same order as NodeWalker.  Containers are visited twice,
+    entering and leaving; leaves once, entering.  The next node is found
+    before each node is yielded, so the current node may be unlinked.
+    """
+    containers = CONTAINERS
+    cur = root
+    entering = True
+    while cur is not None:
+        if entering and containers[cur.type_code]:
+            nxt = cur.first_child
+            if nxt is None:
+                # stay on node but exit
+                nxt = cur
+                nxt_entering = False
+            else:
+                nxt_entering = True
+        elif cur is root:
+            nxt = None
+            nxt_entering = False
+        elif cur.nxt is None:
+            nxt = cur.parent
+            nxt_entering = False
+        else:
+            nxt = cur.nxt
+            nxt_entering = True
+        yield cur, entering
+        cur = nxt
+        entering = nxt_entering
 
 
 class NodeWalker(object):
@@ -27,7 +151,7 @@ class NodeWalker(object):
         if cur is None:
             raise StopIteration
 
-        container = is_container(cur)
+        container = CONTAINERS[cur.type_code]
 
         if entering and container:
             if cur.first_child:
@@ -69,6 +193,51 @@ class NodeWalker(object):
 
 
 class Node(object):
+    # Fields used by every node live in slots.  Fields that only some
+    # node types use are class-level defaults; assigning one stores it
+    # in a per-instance __dict__, which is only allocated on first use.
+    __slots__ = (
+        '_t',
+        'type_code',
+        'parent',
+        'first_child',
+        'last_child',
+        'prv',
+        'nxt',
+        'sourcepos',
+        'last_line_blank',
+        'last_line_checked',
+        'is_open',
+        'string_content',
+        'literal',
+        'list_data',
+        '__dict__',
+        '__weakref__',
+    )
+
+    info = None
+    destination = None
+    title = None
+    is_fenced = False
+    fence_char = None
+    fence_length = 0
+    fence_offset = None
+    level = None
+    on_enter = None
+    on_exit = None
+
+    # The node type.  Setting it also sets type_code, the integer code
+    # of the type that dispatch tables are indexed by.
+    t = property(operator.attrgetter('_t'))
+
+    @t.setter
+    def t(self, node_type):
+        self._t = node_type
+        try:
+            self.type_code = TYPE_CODES[node_type]
+        except KeyError:
+            self.type_code = type_code(node_type)
+
     def __init__(self, node_type, sourcepos):
         self.t = node_type
         self.parent = None
@@ -82,28 +251,38 @@ class Node(object):
         self.is_open = True
         self.string_content = ''
         self.literal = None
-        self.list_data = {}
-        self.info = None
-        self.destination = None
-        self.title = None
-        self.is_fenced = False
-        self.fence_char = None
-        self.fence_length = 0
-        self.fence_offset = None
-        self.level = None
-        self.on_enter = None
-        self.on_exit = None
+        if node_type in ('list', 'item'):
+            self.list_data = {}
+        else:
+            self.list_data = EMPTY_LIST_DATA
 
     def __repr__(self):
         return "Node {} [{}]".format(self.t, self.literal)
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in self.__slots__:
+            if name not in ('_t', 'type_code', '__dict__', '__weakref__'):
+                state[name] = getattr(self, name)
+        # pickled by name: custom node types may have other codes in
+        # another process
+        state['t'] = self._t
+        if state['list_data'] is EMPTY_LIST_DATA:
+            del state['list_data']
+        return state
+
+    def __setstate__(self, state):
+        self.list_data = EMPTY_LIST_DATA
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def pretty(self):
         from pprint import pprint
-        pprint(self.__dict__)
+        pprint(self.__getstate__())
 
     def normalize(self):
         prev = None
-        for curr, _ in self.walker():
+        for curr, _ in walk(self):
             if prev is None:
                 prev = curr
                 continue
@@ -176,4 +355,11 @@ class Node(object):
             sibling.parent.first_child = sibling
 
     def walker(self):
+        """Return a NodeWalker over this node and its descendants."""
         return NodeWalker(self)
+
+    def walk(self):
+        """Iterate over ``(node, entering)`` tuples for this node and its
+        descendants; faster than walker() when resume_at() is not
+        needed."""
+        return walk(self)
@@ -13,6 +13,7 @@
 
 import re
 import sys
+import unicodedata
 from builtins import str, chr
 
 __all__ = ["normalize_reference"]
@@ -60,7 +61,8 @@ def _parse_table(tbl):
     return xlat
 
 
-XLAT = _parse_table(
+# Parsed by _parse_table only where Python's str.casefold can't be used.
+CASE_FOLDING_TABLE = (
     # ===== Start of Unicode Case Folding table =====
     '1t:p:-w;37:-kn;a:m:kn;n:6:;6:3w,37;w:1a:-31:2;1b:5k,lj;1:4:-5k:2;6:e::'
     '2;f:-aa,32;:18:aa:2;19:3e;:4:-3e:2;5:7h;1:-da;:2:5t:2;3:-5p;:5p;1:1:-5'
@@ -91,38 +93,37 @@ XLAT = _parse_table(
 )
 
 
-def _check_native(tbl):
+def _check_native():
     """
     Determine if Python's own native implementation
-    subsumes the supplied case folding table
+    subsumes the case folding table, which is from Unicode 12.0.0:
+    case folding is stable across Unicode versions.
     """
-    try:
-        for i in tbl:
-            stv = chr(i)
-            if stv.casefold() == stv:
-                return False
-    except AttributeError:
+    if not hasattr(chr(65), 'casefold'):
         return False
-    return True
+    version = tuple(int(x) for x in unicodedata.unidata_version.split('.'))
+    return version >= (12, 0, 0)
 
 
 # Hoist version check out of function for performance
 SPACE_RE = re.compile(r'[ \t\r\n]+')
-if _check_native(XLAT):
-    def normalize_reference(string):
-        """
-        Normalize reference label: collapse internal whitespace
-        to single space, remove leading/trailing whitespace, case fold.
-        """
+NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+if _check_native():
+    def _normalize(string):
         return SPACE_RE.sub(' ', string[1:-1].strip()).casefold()
 elif sys.version_info >= (3,) or sys.maxunicode > 0xffff:
-    def normalize_reference(string):
-        """
-        Normalize reference label: collapse internal whitespace
-        to single space, remove leading/trailing whitespace, case fold.
-        """
-        return SPACE_RE.sub(' ', string[1:-1].strip()).translate(XLAT)
+    XLAT = _parse_table(CASE_FOLDING_TABLE)
+
+    def _normalize(string):
+        label = SPACE_RE.sub(' ', string[1:-1].strip())
+        if NON_ASCII_RE.search(label) is None:
+            # ASCII labels only need lowercasing, which is much faster
+            # than translating through the whole table
+            return label.lower()
+        return label.translate(XLAT)
 else:
+    XLAT = _parse_table(CASE_FOLDING_TABLE)
+
     def _get_smp_regex():
         xls = sorted(x - 0x10000 for x in XLAT if x >= 0x10000)
         xls.append(-1)
@@ -157,9 +158,31 @@ else:
 
     SMP_RE = _get_smp_regex()
 
-    def normalize_reference(string):
-        """
-        Normalize reference label: collapse internal whitespace
-        to single space, remove leading/trailing whitespace, case fold.
-        """
-        return SMP_RE.sub(_subst_handler, string[1:-1].strip()).translate(XLAT)
+    def _normalize(string):
+        label = string[1:-1].strip()
+        if NON_ASCII_RE.search(label) is None:
+            return SPACE_RE.sub(' ', label).lower()
+        return SMP_RE.sub(_subst_handler, label).translate(XLAT)
+
+
+# Normalized labels, emptied once it holds LABEL_CACHE_SIZE of them.
+# Every reference definition and every link label is normalized, and
+# documents use the same labels many times.
+LABEL_CACHE_SIZE = 4096
+_label_cache = {}
+
+
+def normalize_reference(string):
+    """
+    Normalize reference label: collapse internal whitespace
+    to single space, remove leading/trailing whitespace, case fold.
+    """
+    try:
+        return _label_cache[string]
+    except KeyError:
+        pass
+    label = _normalize(string)
+    if len(_label_cache) >= LABEL_CACHE_SIZE:
+        _label_cache.clear()
+    _label_cache[string] = label
+    return label
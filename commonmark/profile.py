@@ -0,0 +1,127 @@
+"""Optional instrumentation of the parser and renderers."""
+from __future__ import absolute_import, division, unicode_literals
+
+import functools
+from collections import defaultdict
+from timeit import default_timer
+
+
+class Profile(object):
+    """
+    Collects where the time of parsing and rendering goes.
+
+    Pass it as the ``profile`` option of ``Parser`` and ``HtmlRenderer``
+    (or as ``profile`` to ``ReStructuredTextRenderer``).  It then records
+    the time spent in and the number of calls of the block phase
+    (``incorporate_line``, ``finalize``), of reference definitions
+    (``parseReference``), of inline parsing (``process_inlines`` and each
+    inline parser, like ``parseBackticks`` or ``handleDelim``), the number
+    of nodes of each type in the parsed documents and the time spent
+    rendering each node type.  Times are inclusive: ``finalize`` is also
+    counted in ``incorporate_line`` when a line closes a block.
+
+    Profiling works by wrapping the methods of the profiled parser and
+    renderer objects, so parsers and renderers created without a profile
+    run exactly the same code as before.  A Profile can be shared by
+    several parsers and renderers, but not between threads.
+
+    Example:
+
+    .. code:: python
+
+        import commonmark
+
+        profile = commonmark.Profile()
+        parser = commonmark.Parser({'profile': profile})
+        renderer = commonmark.HtmlRenderer({'profile': profile})
+        html = renderer.render(parser.parse(text))
+        print(profile.report())
+    """
+    BLOCK_METHODS = ('parse', 'incorporate_line', 'finalize',
+                     'process_inlines')
+    INLINE_METHODS = ('parseReference', 'parseNewline', 'parseBackslash',
+                      'parseBackticks', 'handleDelim', 'parseOpenBracket',
+                      'parseBang', 'parseCloseBracket', 'parseAutolink',
+                      'parseHtmlTag', 'parseEntity', 'parseString',
+                      'processEmphasis')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.nodes = defaultdict(int)
+        self.render_times = defaultdict(float)
+        self.render_calls = defaultdict(int)
+
+    def timed(self, func, name, times, calls):
+        """Return func wrapped to add its time and call count under name
+        to the times and calls dicts."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                times[name] += default_timer() - start
+                calls[name] += 1
+        return wrapper
+
+    def instrument(self, obj, names):
+        for name in names:
+            setattr(obj, name, self.timed(
+                getattr(obj, name), name, self.times, self.calls))
+
+    def instrument_parser(self, parser):
+        """Wrap the methods of a Parser, and of its InlineParser, to
+        record their time."""
+        self.instrument(parser, self.BLOCK_METHODS)
+        self.instrument(parser.inline_parser, self.INLINE_METHODS)
+        parse = parser.parse
+
+        @functools.wraps(parse)
+        def count_nodes(*args, **kwargs):
+            doc = parse(*args, **kwargs)
+            for node, entering in doc.walk():
+                if entering:
+                    self.nodes[node.t] += 1
+            return doc
+        parser.parse = count_nodes
+
+    def render_handler(self, node_type, handler):
+        """Return a renderer's handler for node_type, wrapped to record its
+        time.  Children are rendered between the entering and leaving
+        calls, so their time is not included."""
+        return self.timed(handler, node_type, self.render_times,
+                          self.render_calls)
+
+    def as_dict(self):
+        """Return the recorded data as a dict of plain dicts."""
+        return {
+            'times': dict(self.times),
+            'calls': dict(self.calls),
+            'nodes': dict(self.nodes),
+            'render_times': dict(self.render_times),
+            'render_calls': dict(self.render_calls),
+        }
+
+    def report(self):
+        """Return the recorded data as a human-readable table."""
+        lines = ['%-24s %10s %12s' % ('parse', 'calls', 'ms')]
+        for name in sorted(self.times, key=self.times.get, reverse=True):
+            lines.append('%-24s %10d %12.3f' % (
+                name, self.calls[name], self.times[name] * 1000))
+        lines.append('')
+        lines.append('%-24s %10s %12s' % ('render', 'calls', 'ms'))
+        for name in sorted(self.render_times, key=self.render_times.get,
+                           reverse=True):
+            lines.append('%-24s %10d %12.3f' % (
+                name, self.render_calls[name],
+                self.render_times[name] * 1000))
+        lines.append('')
+        lines.append('%-24s %10s' % ('node', 'count'))
+        for name in sorted(self.nodes, key=self.nodes.get, reverse=True):
+            lines.append('%-24s %10d' % (name, self.nodes[name]))
+        return '\n'.join(lines) + '\n'
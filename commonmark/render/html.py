@@ -28,6 +28,7 @@ class HtmlRenderer(Renderer):
         self.disable_tags = 0
         self.last_out = '\n'
         self.options = options
+        self.profile = options.get('profile')
 
     def escape(self, text):
         return escape_xml(text)
@@ -37,15 +38,15 @@ class HtmlRenderer(Renderer):
         if self.disable_tags > 0:
             return
 
-        self.buf += '<' + name
+        s = '<' + name
         if attrs and len(attrs) > 0:
             for attrib in attrs:
-                self.buf += ' ' + attrib[0] + '="' + attrib[1] + '"'
+                s += ' ' + attrib[0] + '="' + attrib[1] + '"'
 
         if selfclosing:
-            self.buf += ' /'
+            s += ' /'
 
-        self.buf += '>'
+        self.write(s + '>')
         self.last_out = '>'
 
     # Node methods #
@@ -99,7 +100,8 @@ class HtmlRenderer(Renderer):
         self.tag('strong' if entering else '/strong')
 
     def paragraph(self, node, entering):
-        grandparent = node.parent.parent
+        # blocks emitted by Parser.feed() have no parent
+        grandparent = node.parent.parent if node.parent else None
         attrs = self.attrs(node)
         if grandparent is not None and grandparent.t == 'list':
             if grandparent.list_data['tight']:
@@ -1,32 +1,95 @@
 from __future__ import unicode_literals
 
+import io
+
+from commonmark.node import NODE_TYPES
+
+# Marks the handlers not looked up yet in Renderer.walk
+_missing = object()
+
 
 class Renderer(object):
+    # A commonmark.Profile recording the time spent in each handler.
+    profile = None
+
     def render(self, ast):
         """Walks the AST and calls member methods for each Node type.
 
         @param ast {Node} The root of the abstract syntax tree.
         """
-        walker = ast.walker()
+        self.buf = []
+        for _ in self.walk(ast, self.buf.append):
+            pass
+        return ''.join(self.buf)
 
-        self.buf = ''
-        self.last_out = '\n'
+    def render_to(self, ast, fp):
+        """Walks the AST and writes the output to a text stream as it
+        is produced, instead of building one string.
 
-        event = walker.nxt()
-        while event is not None:
-            type_ = event['node'].t
-            if hasattr(self, type_):
-                getattr(self, type_)(event['node'], event['entering'])
-            event = walker.nxt()
+        @param ast {Node} The root of the abstract syntax tree.
+        @param fp {TextIO} Any object with a ``write`` method accepting
+        text.
+        """
+        for _ in self.walk(ast, fp.write):
+            pass
 
-        return self.buf
+    def render_iter(self, ast, chunk_size=8192):
+        """Walks the AST and yields the output in chunks of at least
+        ``chunk_size`` characters (except for the last one).
+
+        @param ast {Node} The root of the abstract syntax tree.
+        @param chunk_size {int} Minimum size of each yielded chunk.
+        """
+        stream = io.StringIO()
+        for _ in self.walk(ast, stream.write):
+            if stream.tell() >= chunk_size:
+                yield stream.getvalue()
+                stream.seek(0)
+                stream.truncate()
+        if stream.tell():
+            yield stream.getvalue()
+
+    def walk(self, ast, write):
+        """Calls the member method for each Node type, sending output to
+        ``write``.  Generator yielding once per walker event.
+
+        @param ast {Node} The root of the abstract syntax tree.
+        @param write {Function} Called with each chunk of output.
+        """
+        self.write = write
+        self.last_out = '\n'
+
+        # Handlers are looked up once per node type and render call, so
+        # overrides on subclasses or instances are always honoured.
+        # The table is indexed by node type code.  It grows if a handler
+        # gives a node a type registered during this call.
+        handlers = [_missing] * len(NODE_TYPES)
+        for node, entering in ast.walk():
+            try:
+                handler = handlers[node.type_code]
+            except IndexError:
+                handlers.extend(
+                    [_missing] * (len(NODE_TYPES) - len(handlers)))
+                handler = _missing
+            if handler is _missing:
+                handler = getattr(self, node.t, None)
+                if handler is not None and self.profile is not None:
+                    handler = self.profile.render_handler(node.t, handler)
+                handlers[node.type_code] = handler
+            if handler is not None:
+                handler(node, entering)
+            yield
 
     def lit(self, s):
         """Concatenate a literal string to the buffer.
 
+        Output goes through ``self.write``, which appends to a list of
+        chunks that is joined once at the end of ``render``, or writes
+        to the stream given to ``render_to``.
+
         @param str {String} The string to concatenate.
         """
-        self.buf += s
+        self.write(s)
         self.last_out = s
 
     def cr(self):
@@ -21,9 +21,12 @@ class ReStructuredTextRenderer(Renderer):
         rst = renderer.render(ast)
         print(rst)  # Hello ``inline code`` example
     """
-    def __init__(self, indent_char=' '):
+    def __init__(self, indent_char=' ', profile=None):
         self.indent_char = indent_char
+        self.profile = profile
         self.indent_length = 0
+        self.line_length = 0
+        self.heading_length = 0
 
     def lit(self, s):
         if s == '\n':
@@ -33,6 +36,16 @@ class ReStructuredTextRenderer(Renderer):
         else:
             indent = self.indent_char * self.indent_length
 
+        # Length of the current line, without indentation, and of the
+        # longest line of the current heading, which sets the length of
+        # its underline.
+        if '\n' in s:
+            self.line_length = len(s) - s.rfind('\n') - 1
+        else:
+            self.line_length += len(s)
+        if self.line_length > self.heading_length:
+            self.heading_length = self.line_length
+
         return super(ReStructuredTextRenderer, self).lit(indent + s)
 
     def cr(self):
@@ -69,7 +82,7 @@ class ReStructuredTextRenderer(Renderer):
         self.out('**')
 
     def paragraph(self, node, entering):
-        if node.parent.t == 'item':
+        if node.parent is not None and node.parent.t == 'item':
             pass
         else:
             self.cr()
@@ -150,12 +163,11 @@ class ReStructuredTextRenderer(Renderer):
             # Default to the last level if we're in too deep
             heading_char = heading_chars[-1]
 
-        heading_length = len(node.first_child.literal)
-        banner = heading_char * heading_length
-
         if entering:
             self.cr()
+            self.heading_length = 0
         else:
+            banner = heading_char * self.heading_length
             self.cr()
             self.out(banner)
             self.cr()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""Pathological inputs, ported from cmark's test/pathological_tests.py.
+
+Each input is parsed at two sizes, SCALE times apart.  Parsing must take
+linear time, so the larger input may take at most MAX_RATIO times as
+long as the smaller one (a quadratic case would take SCALE ** 2 times as
+long).  The output is also checked against a regular expression.  The
+FEED_CASES inputs are pushed to ``Parser.feed()`` in small chunks.
+
+Run with::
+
+    python -m commonmark.tests.pathological_tests
+"""
+from __future__ import division, unicode_literals
+
+import re
+import timeit
+import unittest
+
+import commonmark
+
+SCALE = 4
+MAX_RATIO = 10
+
+
+def isqrt(n):
+    return int(n ** 0.5)
+
+
+# name: (function from size to input, size, expected output regex)
+CASES = {
+    'nested strong emph': (
+        lambda n: '*a **a ' * n + 'b' + ' a** a*' * n, 1000,
+        lambda n: '(<em>a <strong>a ){%d}b( a</strong> a</em>){%d}' % (n, n)),
+    'many emph closers with no openers': (
+        lambda n: 'a_ ' * n, 10000,
+        lambda n: '(a_ ){%d}a_' % (n - 1)),
+    'many emph openers with no closers': (
+        lambda n: '_a ' * n, 10000,
+        lambda n: '(_a ){%d}_a' % (n - 1)),
+    'many link closers with no openers': (
+        lambda n: 'a]' * n, 10000,
+        lambda n: '(a\\]){%d}' % n),
+    'many link openers with no closers': (
+        lambda n: '[a' * n, 10000,
+        lambda n: '(\\[a){%d}' % n),
+    'mismatched openers and closers': (
+        lambda n: '*a_ ' * n, 5000,
+        lambda n: '(\\*a_ ){%d}\\*a_' % (n - 1)),
+    'openers and closers multiple of 3': (
+        lambda n: 'a**b' + 'c* ' * n, 10000,
+        lambda n: 'a\\*\\*b(c\\* ){%d}c\\*' % (n - 1)),
+    'link openers and emph closers': (
+        lambda n: '[ a_' * n, 5000,
+        lambda n: '(\\[ a_){%d}' % n),
+    'pattern [ (]( repeated': (
+        lambda n: '[ (](' * n, 5000,
+        lambda n: '(\\[ \\(\\]\\(){%d}' % n),
+    'pattern ![[]() repeated': (
+        lambda n: '![[]()' * n, 5000,
+        lambda n: '(!\\[<a href=""></a>){%d}' % n),
+    'hard link/emph case': (
+        lambda n: '**x [a*b**c*](d)', 1,
+        lambda n: '\\*\\*x <a href="d">a<em>b\\*\\*c</em></a>'),
+    'nested brackets': (
+        lambda n: '[' * n + 'a' + ']' * n, 10000,
+        lambda n: '\\[{%d}a\\]{%d}' % (n, n)),
+    'nested block quotes': (
+        lambda n: '> ' * n + 'a', 2000,
+        lambda n: '(<blockquote>\n){%d}' % n),
+    # the input grows with the square of the depth
+    'deeply nested lists': (
+        lambda n: ''.join('  ' * x + '* a\n' for x in range(isqrt(n))),
+        10000,
+        lambda n: '<ul>\n(<li>a\n<ul>\n){%d}<li>a</li>\n</ul>\n'
+                  '(</li>\n</ul>\n){%d}' % (isqrt(n) - 1, isqrt(n) - 1)),
+    # runs of 1, 2, 3... backticks, which never close each other
+    'backticks': (
+        lambda n: ''.join('e' + '`' * x for x in range(1, isqrt(2 * n))),
+        50000,
+        lambda n: '^<p>(e`+)+</p>\n$'),
+    'many code spans': (
+        lambda n: '`a` ``b`` ' * n, 5000,
+        lambda n: '(<code>a</code> <code>b</code> ){%d}' % (n - 1)),
+    'U+0000 in input': (
+        lambda n: 'abc\u0000de\u0000' * n, 10000,
+        lambda n: '(abc\ufffdde\ufffd){%d}' % n),
+    'unclosed links A': (
+        lambda n: '[a](<b' * n, 5000,
+        lambda n: '(\\[a\\]\\(&lt;b){%d}' % n),
+    'unclosed links B': (
+        lambda n: '[a](b' * n, 5000,
+        lambda n: '(\\[a\\]\\(b){%d}' % n),
+    'unclosed <!--': (
+        lambda n: '</' + '<!--' * n, 10000,
+        lambda n: '&lt;/(&lt;!--){%d}' % n),
+    'link in brackets': (
+        lambda n: '[' * n + '[a](b)' * n, 5000,
+        lambda n: '\\[{%d}(<a href="b">a</a>){%d}' % (n, n)),
+    'many references': (
+        lambda n: ''.join('[%d]: u\n' % x for x in range(1, n)) +
+        '[0] ' * n, 5000,
+        lambda n: '(\\[0\\] ){%d}' % (n - 1)),
+    'long run of emphasis characters': (
+        lambda n: '**' * n + 'a' + '*' * n, 10000,
+        lambda n: '(<strong>){%d}' % (n // 2)),
+}
+
+FEED_CASES = {
+    # like a stream of tokens from a language model
+    'long line fed in small chunks': (
+        lambda n: 'word ' * n, 20000,
+        lambda n: '^<p>(word ){%d}word</p>\n$' % (n - 1)),
+}
+
+
+def feed(text, chunk_size=4):
+    """Render text pushed to Parser.feed() chunk_size characters at a
+    time."""
+    parser = commonmark.Parser()
+    renderer = commonmark.HtmlRenderer()
+    blocks = []
+    for i in range(0, len(text), chunk_size):
+        blocks.extend(parser.feed(text[i:i + chunk_size]))
+    blocks.extend(parser.close())
+    return ''.join(renderer.render(block) for block in blocks)
+
+
+class TestPathological(unittest.TestCase):
+    def check(self, name, cases=CASES, render=commonmark.commonmark):
+        make_input, size, expected = cases[name]
+        times = []
+        for n in (size, size * SCALE):
+            text = make_input(n)
+            result = []
+            times.append(min(timeit.repeat(
+                lambda: result.append(render(text)),
+                number=1, repeat=2)))
+            self.assertTrue(
+                re.search(expected(n), result[0]),
+                '%s: unexpected output for size %d' % (name, n))
+        ratio = times[1] / max(times[0], 1e-3)
+        self.assertLess(
+            ratio, MAX_RATIO,
+            '%s: %d times larger input took %.1f times as long' % (
+                name, SCALE, ratio))
+
+
+def add_test(name, *args):
+    def test(self):
+        self.check(name, *args)
+    test.__name__ = str('test_' + re.sub(r'\W+', '_', name))
+    setattr(TestPathological, test.__name__, test)
+
+
+for _name in CASES:
+    add_test(_name)
+for _name in FEED_CASES:
+    add_test(_name, FEED_CASES, feed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,6 @@
+from __future__ import unicode_literals
+
+import io
 import unittest
 
 import commonmark
@@ -170,6 +173,25 @@ Heading 6
 '''
         self.assertEqualRender(src_markdown, expected_rst)
 
+    def test_heading_markup(self):
+        src_markdown = '''
+# `code` heading
+'''
+        expected_rst = '''
+``code`` heading
+################
+'''
+        self.assertEqualRender(src_markdown, expected_rst)
+
+    def test_heading_edge_cases(self):
+        # a heading without rendered text gets an empty underline
+        self.assertEqualRender('#', '\n\n\n')
+        self.assertEqualRender('# <b>', '\n\n\n')
+        self.assertEqualRender('# *a* b', '\n*a* b\n#####\n')
+        # a multi-line setext heading is underlined to its longest line
+        self.assertEqualRender('a\nlonger\nb\n===',
+                               '\na\nlonger\nb\n######\n')
+
     def test_multiple_paragraphs(self):
         src_markdown = '''
 Start of first paragraph that
@@ -185,6 +207,17 @@ This is the second paragraph
 '''
         self.assertEqualRender(src_markdown, expected_rst)
 
+    def test_render_to(self):
+        src_markdown = '# Title\n\n- item *one*\n- item two\n\n> quote\n'
+        ast = self.parser.parse(src_markdown)
+        expected_rst = self.renderer.render(ast)
+        out = io.StringIO()
+        self.renderer.render_to(ast, out)
+        self.assertEqual(out.getvalue(), expected_rst)
+        self.assertEqual(
+            ''.join(self.renderer.render_iter(ast, chunk_size=4)),
+            expected_rst)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import io
 import unittest
 
 try:
@@ -72,6 +73,86 @@ class TestCommonmark(unittest.TestCase):
         # assert normalize() doesn't alter a normalized ast
         assert_text_literals(['_a'])
 
+    def test_render_many(self):
+        texts = ['*a*', '# b', '- c'] * 5
+        expected = [commonmark.commonmark(text) for text in texts]
+        self.assertEqual(
+            list(commonmark.render_many(texts, workers=1)), expected)
+        self.assertEqual(
+            list(commonmark.render_many(texts, workers=2, chunksize=2)),
+            expected)
+        self.assertEqual(
+            list(commonmark.render_many(texts[:3], format='rst', workers=2)),
+            [commonmark.commonmark(text, 'rst') for text in texts[:3]])
+        self.assertRaises(ValueError, list,
+                          commonmark.render_many(texts, format='xml'))
+
+    def test_render_many_paths(self):
+        import os
+        import shutil
+        import tempfile
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i, text in enumerate(['*a*', '\u2020']):
+                paths.append(os.path.join(tmpdir, '%d.md' % i))
+                with io.open(paths[-1], 'w', encoding='utf-8') as f:
+                    f.write(text)
+            self.assertEqual(
+                list(commonmark.render_many(paths, workers=2, paths=True)),
+                ['<p><em>a</em></p>\n', '<p>\u2020</p>\n'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_output_paths(self):
+        import os
+        from commonmark.cmark import output_paths
+        self.assertEqual(
+            output_paths(['a/x.md', 'b/y.md'], 'out', 'html'),
+            [os.path.join('out', 'x.html'), os.path.join('out', 'y.html')])
+        self.assertRaises(ValueError, output_paths,
+                          ['a/x.md', 'b/x.md'], 'out', 'html')
+
+    def test_cmark(self):
+        import os
+        import shutil
+        import subprocess
+        import sys
+        import tempfile
+
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(
+            os.path.dirname(os.path.abspath(commonmark.__file__))))
+
+        def cmark(*args):
+            proc = subprocess.Popen(
+                [sys.executable, '-m', 'commonmark.cmark'] + list(args),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=tmpdir,
+                env=env)
+            out, err = proc.communicate()
+            return proc.returncode, err.decode('utf-8')
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with io.open(os.path.join(tmpdir, 'x.md'), 'w') as f:
+                f.write('*a*\n')
+            status, err = cmark('missing.md')
+            self.assertEqual(status, 2)
+            self.assertIn("argument infile: can't open 'missing.md'", err)
+            status, err = cmark('x.md', 'missing.md', '-d', 'out')
+            self.assertEqual(status, 2)
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, 'out')))
+            self.assertEqual(cmark('x.md', '-d', 'out/html'), (0, ''))
+            with io.open(os.path.join(tmpdir, 'out', 'html', 'x.html')) as f:
+                self.assertEqual(f.read(), '<p><em>a</em></p>\n')
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dumpJSON_to_stream(self):
+        ast = Parser().parse('- a\n- *b*\n')
+        out = io.StringIO()
+        commonmark.dumpJSON(ast, out)
+        self.assertEqual(out.getvalue(), commonmark.dumpJSON(ast))
+
     def test_dumpAST_orderedlist(self):
         md = '1.'
         ast = Parser().parse(md)
@@ -115,21 +196,349 @@ class TestCommonmark(unittest.TestCase):
                              '[]( %d deep' % (i,))
             i *= 10
 
+    def test_long_paragraph(self):
+        chunk = 'a `b` [c](/d) <http://e> &amp; <f> \\* '
+        expected = ('a <code>b</code> <a href="/d">c</a> '
+                    '<a href="http://e">http://e</a> &amp; <f> * ')
+        s = commonmark.commonmark(chunk * 1000)
+        self.assertEqual(s, '<p>' + (expected * 1000).rstrip() + '</p>\n')
+
+    def test_long_code_block(self):
+        s = commonmark.commonmark('```\n' + 'a < b\n' * 10000 + '```\n')
+        self.assertEqual(
+            s, '<pre><code>' + 'a &lt; b\n' * 10000 + '</code></pre>\n')
+
+    def test_escaping(self):
+        from commonmark.common import escape_xml, unescape_string
+        self.assertEqual(escape_xml('a & "b" <c>'),
+                         'a &amp; &quot;b&quot; &lt;c&gt;')
+        self.assertEqual(escape_xml('&amp;'), '&amp;amp;')
+        self.assertEqual(escape_xml(None), '')
+        self.assertEqual(unescape_string('a\\*b\\c'), 'a*b\\c')
+        self.assertEqual(unescape_string('\\&amp; &amp; &#42; &x;'),
+                         '&amp; & * &x;')
+
+    def test_normalize_uri(self):
+        from commonmark import common
+        self.assertEqual(common.normalize_uri('/a?b=c&d#e'), '/a?b=c&d#e')
+        self.assertEqual(common.normalize_uri('/caf\u00e9 [1]%20'),
+                         '/caf%C3%A9%20%5B1%5D%20')
+        self.assertEqual(common._uri_cache['/caf\u00e9 [1]%20'],
+                         '/caf%C3%A9%20%5B1%5D%20')
+        for n in range(common.URI_CACHE_SIZE + 1):
+            common.normalize_uri('/%d ' % n)
+        self.assertTrue(len(common._uri_cache) <= common.URI_CACHE_SIZE)
+
+    def test_normalize_reference(self):
+        from commonmark import normalize_reference as module
+        normalize = module.normalize_reference
+        self.assertEqual(normalize('[ Foo \t\n bar ]'), 'foo bar')
+        self.assertEqual(normalize('[\u1e9e \u03a3]'), 'ss \u03c3')
+        self.assertEqual(module._label_cache['[ Foo \t\n bar ]'], 'foo bar')
+        for n in range(module.LABEL_CACHE_SIZE + 1):
+            normalize('[%d]' % n)
+        self.assertTrue(
+            len(module._label_cache) <= module.LABEL_CACHE_SIZE)
+        self.assertEqual(
+            commonmark.commonmark('[\u1e9e]\n\n[SS]: /u\n'),
+            '<p><a href="/u">\u1e9e</a></p>\n')
+
+    def test_line_endings_and_nul(self):
+        s = commonmark.commonmark('a\0\r\nb\r\rc\r')
+        self.assertEqual(s, '<p>a\ufffd\nb</p>\n<p>c</p>\n')
+
+
+class TestRenderCache(unittest.TestCase):
+    def test_render(self):
+        cache = commonmark.RenderCache()
+        self.assertEqual(cache.render('*a*'), '<p><em>a</em></p>\n')
+        self.assertEqual(commonmark.commonmark('*a*', cache=cache),
+                         '<p><em>a</em></p>\n')
+        self.assertEqual(cache.render('"a"', options={'smart': True}),
+                         '<p>\u201ca\u201d</p>\n')
+        self.assertEqual(cache.render('"a"'), '<p>&quot;a&quot;</p>\n')
+        self.assertEqual(cache.render('*a*', format='rst'), '\n*a*\n')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']),
+                         (1, 4, 4))
+
+    def test_eviction(self):
+        cache = commonmark.RenderCache(max_entries=2)
+        for text in ['a', 'b', 'a', 'c', 'b']:
+            cache.render(text)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries'],
+                          stats['evictions']), (1, 4, 2, 2))
+        cache = commonmark.RenderCache(max_bytes=1)
+        cache.render('a')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_threads(self):
+        from multiprocessing.pool import ThreadPool
+        cache = commonmark.RenderCache(max_entries=10)
+        texts = ['*%d*' % (i % 20) for i in range(400)]
+        pool = ThreadPool(8)
+        try:
+            results = pool.map(cache.render, texts)
+        finally:
+            pool.close()
+        self.assertEqual(
+            results, ['<p><em>%d</em></p>\n' % (i % 20) for i in range(400)])
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 400)
+        self.assertEqual(stats['entries'], 10)
+
+    def test_disk(self):
+        import shutil
+        import tempfile
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = commonmark.RenderCache(path=tmpdir)
+            self.assertEqual(cache.render('a\r\nb'), '<p>a\nb</p>\n')
+            cache = commonmark.RenderCache(path=tmpdir)
+            self.assertEqual(cache.render('a\r\nb'), '<p>a\nb</p>\n')
+            self.assertEqual(cache.render('a\r\nb'), '<p>a\nb</p>\n')
+            stats = cache.stats()
+            self.assertEqual(
+                (stats['hits'], stats['disk_hits'], stats['misses']),
+                (1, 1, 0))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_disk_pruning(self):
+        import os
+        import shutil
+        import tempfile
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = commonmark.RenderCache(path=tmpdir, max_disk_entries=10)
+            for n in range(25):
+                cache.render('%d' % n)
+            files = cache.disk_files()
+            self.assertTrue(len(files) <= 10)
+            self.assertEqual(cache.disk_usage(),
+                             (len(files), sum(f[1] for f in files)))
+            self.assertEqual(cache.stats()['disk_evictions'], 25 - len(files))
+
+            # the least recently used files are removed first
+            for i, (_, _, filename) in enumerate(sorted(files)):
+                os.utime(filename, (i, i))
+            oldest = sorted(files)[0][2]
+            cache = commonmark.RenderCache(path=tmpdir, max_disk_entries=10,
+                                           max_disk_bytes=10 ** 6)
+            for n in range(25, 25 + 11 - len(files)):
+                cache.render('%d' % n)
+            self.assertFalse(os.path.exists(oldest))
+            self.assertTrue(len(cache.disk_files()) <= 10)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_render(self):
+        cache = commonmark.BlockCache()
+        text = '# a\n\nb *c*\n\n- d\n- e\n'
+        self.assertEqual(cache.render(text), commonmark.commonmark(text))
+        text = '# a\n\nb *x*\n\n- d\n- e\n'
+        self.assertEqual(cache.render(text), commonmark.commonmark(text))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 4))
+
+    def test_references(self):
+        cache = commonmark.BlockCache()
+        text = 'a [foo]\n\nb\n\n[foo]: /one\n'
+        self.assertIn('href="/one"', cache.render(text))
+        text = 'a [foo]\n\nb\n\n[Foo]: /two\n'
+        html = cache.render(text)
+        self.assertEqual(html, commonmark.commonmark(text))
+        self.assertIn('href="/two"', html)
+        self.assertEqual(cache.stats()['hits'], 1)
+        text = 'a [foo]\n\nb\n'
+        self.assertEqual(cache.render(text), '<p>a [foo]</p>\n<p>b</p>\n')
+
+    def test_references_in_containers(self):
+        cache = commonmark.BlockCache()
+        text = '> [foo\n> bar]\n\n[foo bar]: /one\n'
+        self.assertIn('href="/one"', cache.render(text))
+        text = '> [foo\n> bar]\n\n[foo bar]: /two\n'
+        html = cache.render(text)
+        self.assertEqual(html, commonmark.commonmark(text))
+        self.assertIn('href="/two"', html)
+        # labels of a document parsed outside the cache
+        text = '> [foo\n> bar]\n\n[foo bar]: /three\n'
+        html = cache.render(text, Parser().parse(text))
+        self.assertIn('href="/three"', html)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_options(self):
+        cache = commonmark.BlockCache(options={'smart': True})
+        self.assertEqual(cache.render('"a"'), '<p>\u201ca\u201d</p>\n')
+
+    def test_sourcepos(self):
+        cache = commonmark.BlockCache(options={'sourcepos': True})
+        self.assertIn('data-sourcepos="1:1-1:7"', cache.render('*block*\n'))
+        text = 'new\n\n*block*\n'
+        html = cache.render(text)
+        self.assertIn('data-sourcepos="3:1-3:7"', html)
+        renderer = HtmlRenderer(options={'sourcepos': True})
+        self.assertEqual(html, renderer.render(Parser().parse(text)))
+
+    def test_reparse(self):
+        cache = commonmark.BlockCache()
+        parser = commonmark.Parser()
+        text = 'a\n\nb\n\nc\n'
+        doc = parser.parse(text)
+        cache.render(text, doc)
+        doc = parser.reparse(doc, text, 3, 4, 'x')
+        self.assertEqual(cache.render('a\n\nx\n\nc\n', doc),
+                         '<p>a</p>\n<p>x</p>\n<p>c</p>\n')
+        self.assertEqual(cache.stats()['hits'], 2)
+
+
+class TestProfile(unittest.TestCase):
+    def test_profile(self):
+        profile = commonmark.Profile()
+        text = '# a\n\nb *c* `d` [e]\n\n[e]: /u\n'
+        doc = Parser({'profile': profile}).parse(text)
+        html = HtmlRenderer({'profile': profile}).render(doc)
+        self.assertEqual(html, commonmark.commonmark(text))
+
+        stats = profile.as_dict()
+        self.assertEqual(stats['calls']['parse'], 1)
+        self.assertEqual(stats['calls']['incorporate_line'], 5)
+        self.assertEqual(stats['calls']['parseBackticks'], 1)
+        self.assertEqual(stats['calls']['handleDelim'], 2)
+        self.assertEqual(stats['calls']['parseReference'], 1)
+        self.assertEqual(stats['nodes']['text'], 6)
+        self.assertEqual(stats['nodes']['link'], 1)
+        self.assertEqual(stats['render_calls']['emph'], 2)
+        self.assertTrue(stats['times']['process_inlines'] > 0)
+        self.assertIn('parseBackticks', profile.report())
+
+        profile.reset()
+        self.assertEqual(profile.as_dict()['calls'], {})
+        # without a profile, nothing is wrapped
+        parser = Parser()
+        self.assertNotIn('parse', vars(parser))
+
 
 class TestHtmlRenderer(unittest.TestCase):
     def test_init(self):
         HtmlRenderer()
 
+    def test_render_to(self):
+        ast = Parser().parse('# a\n\nb *c*\n\n```\nd\n```\n')
+        html = HtmlRenderer().render(ast)
+        out = io.StringIO()
+        HtmlRenderer().render_to(ast, out)
+        self.assertEqual(out.getvalue(), html)
+
+    def test_render_iter(self):
+        ast = Parser().parse('para *one*\n\n' * 100)
+        html = HtmlRenderer().render(ast)
+        chunks = list(HtmlRenderer().render_iter(ast, chunk_size=64))
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(len(chunk) >= 64 for chunk in chunks[:-1]))
+        self.assertEqual(''.join(chunks), html)
+
+    def test_subclass_handlers(self):
+        class UpperRenderer(HtmlRenderer):
+            def text(self, node, entering=None):
+                self.out(node.literal.upper())
+
+            def thematic_break(self, node, entering):
+                pass
+
+        ast = Parser().parse('*hello*\n\n***\n')
+        self.assertEqual(UpperRenderer().render(ast),
+                         '<p><em>HELLO</em></p>\n')
+        self.assertEqual(HtmlRenderer().render(ast),
+                         '<p><em>hello</em></p>\n<hr />\n')
+
 
 class TestInlineParser(unittest.TestCase):
     def test_init(self):
         InlineParser()
 
+    def test_code_spans(self):
+        cases = [
+            ('`a``b` ``c`', '<code>a``b</code> ``c`'),
+            ('``a`b`` `c`', '<code>a`b</code> <code>c</code>'),
+            ('\\``a`', '`<code>a</code>'),
+            ('``` `a` ```', '<code>`a`</code>'),
+            ('`a\n\n`b`', '`a</p>\n<p><code>b</code>'),
+        ]
+        for text, expected in cases:
+            self.assertEqual(
+                commonmark.commonmark(text), '<p>' + expected + '</p>\n')
+
 
 class TestNode(unittest.TestCase):
     def test_doc_node(self):
         Node('document', [[1, 1], [0, 0]])
 
+    def test_list_data(self):
+        text_node = Node('text', None)
+        self.assertEqual(dict(text_node.list_data), {})
+        list_node = Node('list', None)
+        list_node.list_data['tight'] = False
+        self.assertEqual(list_node.list_data, {'tight': False})
+        self.assertEqual(dict(Node('item', None).list_data), {})
+
+    def test_optional_fields(self):
+        node = Node('code_block', None)
+        self.assertEqual(node.info, None)
+        node.info = 'python'
+        node.custom = 'value'
+        self.assertEqual(node.info, 'python')
+        self.assertEqual(node.custom, 'value')
+        self.assertEqual(Node('code_block', None).info, None)
+
+    def test_pickle(self):
+        import pickle
+        ast = Parser().parse('- a\n- *b*\n\n```py\ncode\n```\n')
+        html = HtmlRenderer().render(ast)
+        copied = pickle.loads(pickle.dumps(ast))
+        self.assertEqual(HtmlRenderer().render(copied), html)
+
+    def test_type_codes(self):
+        from commonmark.node import NODE_TYPES, TYPE_CODES
+        node = Node('paragraph', None)
+        self.assertEqual(NODE_TYPES[node.type_code], 'paragraph')
+        custom = Node('test_custom_widget', None)
+        self.assertEqual(TYPE_CODES['test_custom_widget'], custom.type_code)
+        self.assertFalse(custom.is_container())
+
+        class WidgetRenderer(HtmlRenderer):
+            def test_custom_widget(self, node, entering):
+                self.lit('<widget />')
+
+        ast = Parser().parse('a')
+        ast.first_child.append_child(custom)
+        self.assertEqual(WidgetRenderer().render(ast),
+                         '<p>a<widget /></p>\n')
+
+    def test_retype(self):
+        import pickle
+        from commonmark.node import TYPE_CODES
+        doc = Parser().parse('one\n\ntwo *three*\n')
+        renderer = HtmlRenderer()
+        renderer.render(doc)
+        heading = doc.first_child
+        heading.t = 'heading'
+        heading.level = 2
+        self.assertEqual(heading.type_code, TYPE_CODES['heading'])
+        emph = heading.nxt.first_child
+        emph.t = 'emph'
+        child = Node('text', None)
+        child.literal = 'four'
+        emph.append_child(child)
+        self.assertIn((child, True), list(doc.walk()))
+        html = '<h2>one</h2>\n<p><em>four</em><em>three</em></p>\n'
+        self.assertEqual(renderer.render(doc), html)
+        self.assertEqual(
+            renderer.render(pickle.loads(pickle.dumps(doc))), html)
+
 
 class TestNodeWalker(unittest.TestCase):
     def test_node_walker(self):
@@ -141,6 +550,22 @@ class TestNodeWalker(unittest.TestCase):
         for subnode, entered in node.walker():
             pass
 
+    def test_walk(self):
+        doc = Parser().parse('# a *b*\n\n- c\n\n  ```\n  d\n  ```\n')
+        events = list(doc.walk())
+        self.assertEqual(events, list(doc.walker()))
+        walker = doc.walker()
+        self.assertEqual(
+            events, [(e['node'], e['entering'])
+                     for e in iter(walker.nxt, None)])
+        self.assertEqual(
+            [(node.t, entering) for node, entering in events[:4]],
+            [('document', True), ('heading', True), ('text', True),
+             ('emph', True)])
+        leaf = Node('text', None)
+        self.assertEqual(list(leaf.walk()), [(leaf, True)])
+        self.assertTrue(Node('custom_block_quote', None).is_container())
+
 
 class TestParser(unittest.TestCase):
     def setUp(self):
@@ -152,6 +577,176 @@ class TestParser(unittest.TestCase):
     def test_text(self, s):
         self.parser.parse(s)
 
+    def render_blocks(self, blocks):
+        renderer = HtmlRenderer()
+        return ''.join(renderer.render(block) for block in blocks)
+
+    def test_source_spans(self):
+        long_line = 'word ' * 60
+        text = (long_line + '\n' + long_line + '\n\n' +
+                '> ' + long_line + '\n> ' + long_line + '\r\n\n' +
+                '    code\n\tmore\n\n[a]: /u\n' + long_line + '[a]\n')
+        doc = Parser(options={'source_spans': True}).parse(text)
+        expected = commonmark.commonmark(text)
+        self.assertEqual(HtmlRenderer().render(doc), expected)
+
+        content = doc.first_child.string_content
+        self.assertEqual(content, [(0, 2 * len(long_line) + 2)])
+        self.assertEqual(content.text(), long_line + '\n' + long_line + '\n')
+        self.assertEqual(
+            commonmark.dumpJSON(doc),
+            commonmark.dumpJSON(Parser().parse(text)))
+
+    def test_blocks_subclass(self):
+        from commonmark.blocks import Paragraph
+
+        class ShoutingParagraph(Paragraph):
+            @staticmethod
+            def finalize(parser=None, block=None):
+                Paragraph.finalize(parser, block)
+                block.string_content = block.string_content.upper()
+
+        class ShoutingParser(Parser):
+            blocks = dict(Parser.blocks, paragraph=ShoutingParagraph)
+
+        md = '# a\n\nhello *b*\n'
+        self.assertEqual(
+            HtmlRenderer().render(ShoutingParser().parse(md)),
+            '<h1>a</h1>\n<p>HELLO <em>B</em></p>\n')
+        self.assertEqual(
+            HtmlRenderer().render(Parser().parse(md)),
+            '<h1>a</h1>\n<p>hello <em>b</em></p>\n')
+
+    def test_limits(self):
+        def render(text, **options):
+            return HtmlRenderer().render(Parser(options).parse(text))
+
+        self.assertEqual(
+            render('> > > a', max_block_nesting=2),
+            '<blockquote>\n<blockquote>\n<p>&gt; a</p>\n'
+            '</blockquote>\n</blockquote>\n')
+        self.assertEqual(
+            render('- - - a', max_block_nesting=2),
+            '<ul>\n<li>\n<ul>\n<li>- a</li>\n</ul>\n</li>\n</ul>\n')
+        self.assertEqual(
+            render('*a **b *c* d** e*', max_inline_nesting=2),
+            '<p>*a <strong>b <em>c</em> d</strong> e*</p>\n')
+        self.assertEqual(
+            render('[a [b *c*](d)](e)', max_inline_nesting=2),
+            '<p>[a <a href="d">b <em>c</em></a>](e)</p>\n')
+        self.assertEqual(
+            render('*a* *b* *c*', max_delimiters=2),
+            '<p><em>a</em> *b* *c*</p>\n')
+        self.assertEqual(
+            render('[a]: /1\n[b]: /2\n\n[a] [b]', max_references=1),
+            '<p>[b]: /2</p>\n<p><a href="/1">a</a> [b]</p>\n')
+
+        with self.assertRaises(commonmark.LimitExceeded) as cm:
+            render('abcd', max_input_size=3)
+        self.assertEqual(cm.exception.limit, 'max_input_size')
+        parser = Parser({'max_input_size': 6})
+        parser.feed('abc')
+        self.assertRaises(commonmark.LimitExceeded, parser.feed, 'defg')
+        with self.assertRaises(commonmark.LimitExceeded) as cm:
+            render('a\n\n*b* c', max_steps=3)
+        self.assertEqual(cm.exception.limit, 'max_steps')
+        with self.assertRaises(commonmark.LimitExceeded) as cm:
+            render('a\n' * 1000, time_limit=-1)
+        self.assertEqual(cm.exception.limit, 'time_limit')
+        self.assertEqual(render('a\n\n*b* c', max_steps=20),
+                         '<p>a</p>\n<p><em>b</em> c</p>\n')
+
+    def test_limits_in_workers(self):
+        import pickle
+        e = commonmark.LimitExceeded('max_steps', 10)
+        e = pickle.loads(pickle.dumps(e))
+        self.assertEqual((e.limit, e.value), ('max_steps', 10))
+        self.assertEqual(str(e), 'max_steps of 10 exceeded')
+
+        # raised in a worker process and sent back to the parent
+        with self.assertRaises(commonmark.LimitExceeded) as cm:
+            Parser({'inline_workers': 2, 'time_limit': -1}).parse(
+                'a *b* ' * 100)
+        self.assertEqual(cm.exception.limit, 'time_limit')
+        for name, value in (('max_steps', 10),
+                            ('profile', commonmark.Profile())):
+            self.assertRaises(ValueError, Parser,
+                              {'inline_workers': 2, name: value})
+        with self.assertRaises(commonmark.LimitExceeded) as cm:
+            list(commonmark.render_many(['a\n' * 100] * 2, workers=2,
+                                        options={'max_steps': 10}))
+        self.assertEqual(cm.exception.limit, 'max_steps')
+
+    def test_feed(self):
+        md = '# Title\r\n\r\npara *one*\r\ncontinued\r\n\r\n- a\r\n- b\r\n'
+        blocks = []
+        sizes = []
+        for c in md:
+            blocks.extend(self.parser.feed(c))
+            sizes.append(len(blocks))
+        self.assertEqual([b.t for b in blocks], ['heading', 'paragraph'])
+        blocks.extend(self.parser.close())
+        self.assertEqual([b.t for b in blocks],
+                         ['heading', 'paragraph', 'list'])
+        self.assertEqual(self.render_blocks(blocks),
+                         HtmlRenderer().render(Parser().parse(md)))
+        # the heading is emitted as soon as the next line starts
+        self.assertEqual(sizes[md.index('para') + 1], 1)
+
+    def test_inline_workers(self):
+        md = ('# *a* [b]\n\n"c" -- [d](/e "f")\n\n> - ![g](h)\n\n'
+              '[b]: /url\n') * 10
+        options = {'smart': True}
+        expected = HtmlRenderer().render(Parser(dict(options)).parse(md))
+        options['inline_workers'] = 2
+        ast = Parser(options).parse(md)
+        self.assertEqual(HtmlRenderer().render(ast), expected)
+
+    def assert_reparse(self, text, start, end, replacement, partial=True):
+        doc = self.parser.parse(text)
+        new_text = text[:start] + replacement + text[end:]
+        new_doc = Parser().reparse(doc, text, start, end, replacement)
+        self.assertEqual(new_doc is doc, partial)
+        renderer = HtmlRenderer(options={'sourcepos': True})
+        self.assertEqual(renderer.render(new_doc),
+                         renderer.render(Parser().parse(new_text)))
+
+    def test_reparse(self):
+        text = '# a\n\nb [c]\n\n> d\n\ne\n\n[c]: /url\n'
+        self.assert_reparse(text, 7, 8, 'B *x*')
+        self.assert_reparse(text, 7, 8, 'b\n\nnew paragraph')
+        # joining two paragraphs
+        self.assert_reparse(text, 12, 13, '')
+        # setext heading underline
+        self.assert_reparse(text, 12, 13, '===')
+        self.assert_reparse(text, 0, 0, 'start\n')
+        self.assert_reparse('a\n\nb\n', 5, 5, '\nend\n')
+
+    def test_reparse_fallback(self):
+        text = '- a\n\nb\n\n[c]: /url\n\n[c]\n'
+        # the paragraph could join the list before it
+        self.assert_reparse(text, 5, 6, '  b', partial=False)
+        # reference definitions change
+        self.assert_reparse(text, 13, 16, '/other', partial=False)
+        # an unclosed fence swallows the rest
+        self.assert_reparse(text, 5, 6, '```', partial=False)
+
+    def test_feed_references(self):
+        md = '[foo]\n\n[foo]: /url\n'
+        blocks = self.parser.feed(md) + self.parser.close()
+        self.assertEqual(self.render_blocks(blocks), '<p>[foo]</p>\n')
+
+        parser = Parser(options={'defer_references': True})
+        self.assertEqual(parser.feed(md), [])
+        blocks = parser.close()
+        self.assertEqual(self.render_blocks(blocks),
+                         '<p><a href="/url">foo</a></p>\n')
+
+        parser = Parser(options={'defer_references': True})
+        blocks = parser.feed(md + '\nnext\n\n')
+        self.assertEqual(self.render_blocks(blocks),
+                         '<p><a href="/url">foo</a></p>\n<p>next</p>\n')
+
 
 if __name__ == '__main__':
     unittest.main()